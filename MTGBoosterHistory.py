@@ -0,0 +1,186 @@
+######################################################################################################
+# Imports
+from contextlib import closing
+from dataclasses import dataclass
+import json
+import os
+import sqlite3
+import threading
+
+# Append-only history of generated boosters, stored in SQLite.
+# Replaces rewriting the whole boosters.json file for every booster
+@dataclass
+class MTGBoosterHistory:
+
+    db_file:str
+    json_file:str
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS boosters (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            generated_at TEXT NOT NULL,
+            set_name TEXT,
+            setCode TEXT NOT NULL,
+            releaseDate TEXT,
+            type TEXT,
+            boosterTotalValue REAL
+        );
+        CREATE TABLE IF NOT EXISTS booster_cards (
+            booster_id INTEGER NOT NULL REFERENCES boosters(id),
+            position INTEGER NOT NULL,
+            setCode TEXT NOT NULL,
+            name TEXT,
+            uuid TEXT NOT NULL,
+            scryfallId TEXT,
+            rarity TEXT,
+            foil INTEGER,
+            price REAL
+        );
+        CREATE TABLE IF NOT EXISTS ownership (
+            setCode TEXT NOT NULL,
+            uuid TEXT NOT NULL,
+            owned INTEGER NOT NULL,
+            foils INTEGER NOT NULL,
+            first_seen TEXT,
+            PRIMARY KEY (setCode, uuid)
+        );
+        CREATE TABLE IF NOT EXISTS history_meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_boosters_setCode ON boosters(setCode);
+        CREATE INDEX IF NOT EXISTS idx_booster_cards_setCode_uuid ON booster_cards(setCode, uuid);
+        CREATE INDEX IF NOT EXISTS idx_booster_cards_booster_id ON booster_cards(booster_id);
+    '''
+
+    def __init__(self, db_file:str='./cache/metadata/boosters.db', json_file:str='./cache/metadata/boosters.json'):
+        self.db_file = db_file
+        self.json_file = json_file
+        self.lock = threading.Lock()
+        db_dir = os.path.dirname(self.db_file)
+        if db_dir and not os.path.isdir(db_dir): os.makedirs(db_dir)
+        with closing(self.__connect__()) as conn:
+            with conn: conn.executescript(self.SCHEMA)
+        self.import_json()
+        # histories written before the ownership index existed
+        with closing(self.__connect__()) as conn:
+            built = self.__get_meta__(conn, 'ownership_built') is not None
+        if not built: self.rebuild_ownership()
+
+    # one connection per operation, boosters are generated from worker threads
+    def __connect__(self):
+        return sqlite3.connect(self.db_file, timeout=30)
+
+    def __get_meta__(self, conn, key:str):
+        row = conn.execute('SELECT value FROM history_meta WHERE key=?', (key,)).fetchone()
+        return None if row is None else row[0]
+
+    def __insert_booster__(self, conn, generated_at:str, booster_json:dict)->int:
+        cursor = conn.execute('INSERT INTO boosters (generated_at, set_name, setCode, releaseDate, type, boosterTotalValue) VALUES (?,?,?,?,?,?)',
+                              (generated_at, booster_json.get('set'), booster_json['setCode'], booster_json.get('releaseDate'),
+                               booster_json.get('type'), booster_json.get('boosterTotalValue', 0.0)))
+        booster_id = cursor.lastrowid
+        conn.executemany('INSERT INTO booster_cards (booster_id, position, setCode, name, uuid, scryfallId, rarity, foil, price) VALUES (?,?,?,?,?,?,?,?,?)',
+                         [(booster_id, i, booster_json['setCode'], c.get('name'), c['uuid'], c.get('scryfallId'), c.get('rarity'),
+                           int(bool(c.get('foil', False))), c.get('price', 0.0)) for i, c in enumerate(booster_json['cards'])])
+        # ownership index is kept up to date with every booster
+        conn.executemany('INSERT INTO ownership (setCode, uuid, owned, foils, first_seen) VALUES (?,?,1,?,?) '
+                         'ON CONFLICT(setCode, uuid) DO UPDATE SET owned=owned+1, foils=foils+excluded.foils, first_seen=MIN(first_seen, excluded.first_seen)',
+                         [(booster_json['setCode'], c['uuid'], int(bool(c.get('foil', False))), generated_at) for c in booster_json['cards']])
+        return booster_id
+
+    # recomputes the ownership index from the whole history (only needed once, for
+    # histories written by previous versions, or to repair the index)
+    def rebuild_ownership(self)->int:
+        with self.lock, closing(self.__connect__()) as conn:
+            with conn:
+                conn.execute('DELETE FROM ownership')
+                conn.execute('INSERT INTO ownership (setCode, uuid, owned, foils, first_seen) '
+                             'SELECT c.setCode, c.uuid, COUNT(*), SUM(c.foil), MIN(b.generated_at) FROM booster_cards c JOIN boosters b ON b.id=c.booster_id GROUP BY c.setCode, c.uuid')
+                conn.execute('INSERT OR REPLACE INTO history_meta (key, value) VALUES (?,?)', ('ownership_built', '1'))
+                return conn.execute('SELECT COUNT(*) FROM ownership').fetchone()[0]
+
+    # one-time import of the boosters.json file written by previous versions
+    def import_json(self, force:bool=False)->int:
+        if not os.path.isfile(self.json_file): return 0
+        with self.lock, closing(self.__connect__()) as conn:
+            if not force and self.__get_meta__(conn, 'imported_json') is not None: return 0
+            with open(self.json_file, 'r') as file:
+                boosters_json = json.loads(file.read())
+            with conn:
+                for generated_at, booster_json in boosters_json.items():
+                    self.__insert_booster__(conn, generated_at, booster_json)
+                conn.execute('INSERT OR REPLACE INTO history_meta (key, value) VALUES (?,?)', ('imported_json', self.json_file))
+        print(f'Imported {len(boosters_json)} boosters from {self.json_file}')
+        return len(boosters_json)
+
+    def add_booster(self, generated_at:str, booster_json:dict)->int:
+        with self.lock, closing(self.__connect__()) as conn:
+            with conn: return self.__insert_booster__(conn, generated_at, booster_json)
+
+    # [(generated_at, booster_json), ...] in a single transaction
+    def add_boosters(self, boosters:list[tuple])->int:
+        with self.lock, closing(self.__connect__()) as conn:
+            with conn:
+                for generated_at, booster_json in boosters:
+                    self.__insert_booster__(conn, generated_at, booster_json)
+        return len(boosters)
+
+    # returns which of the given uuids were already collected in a set
+    def get_collected_uuids(self, set_code:str, uuids:list[str])->set:
+        uuids = list(set(uuids))
+        if len(uuids)==0: return set()
+        with closing(self.__connect__()) as conn:
+            query = 'SELECT uuid FROM ownership WHERE setCode=? AND uuid IN ('+','.join('?'*len(uuids))+')'
+            return {row[0] for row in conn.execute(query, [set_code]+uuids)}
+
+    # {uuid: (owned, foils, first_seen)} of every collected card of a set
+    def get_ownership(self, set_code:str)->dict:
+        with closing(self.__connect__()) as conn:
+            return {row[0]:(row[1], row[2], row[3]) for row in conn.execute('SELECT uuid, owned, foils, first_seen FROM ownership WHERE setCode=?', (set_code,))}
+
+    def is_collected(self, set_code:str, uuid:str)->bool:
+        return len(self.get_collected_uuids(set_code, [uuid]))>0
+
+    # (uuid, foil) of every collected card of a set, in the order boosters were opened
+    def get_collected_cards(self, set_code:str)->list[tuple]:
+        with closing(self.__connect__()) as conn:
+            return [(row[0], bool(row[1])) for row in conn.execute('SELECT uuid, foil FROM booster_cards WHERE setCode=? ORDER BY booster_id, position', (set_code,))]
+
+    # [(setCode, uuid, scryfallId, name, foil, count)] of every collected card (once per
+    # set and uuid, foil if any copy is foil), for all sets or only the given ones
+    def get_owned_cards(self, set_codes:list[str]=None)->list[tuple]:
+        query = 'SELECT setCode, uuid, MAX(scryfallId), MAX(name), MAX(foil), COUNT(*) FROM booster_cards'
+        params = []
+        if set_codes is not None:
+            if len(set_codes)==0: return []
+            query += ' WHERE setCode IN ('+','.join('?'*len(set_codes))+')'
+            params = list(set_codes)
+        query += ' GROUP BY setCode, uuid'
+        with closing(self.__connect__()) as conn:
+            return [(row[0], row[1], row[2], row[3], bool(row[4]), row[5]) for row in conn.execute(query, params)]
+
+    # boosters in the boosters.json format ({generated_at: booster_json})
+    def get_boosters(self, set_code:str=None)->dict:
+        boosters = {}
+        with closing(self.__connect__()) as conn:
+            if set_code is None: booster_rows = conn.execute('SELECT id, generated_at, set_name, setCode, releaseDate, type, boosterTotalValue FROM boosters ORDER BY id').fetchall()
+            else: booster_rows = conn.execute('SELECT id, generated_at, set_name, setCode, releaseDate, type, boosterTotalValue FROM boosters WHERE setCode=? ORDER BY id', (set_code,)).fetchall()
+            cards = {}
+            card_rows = conn.execute('SELECT booster_id, name, uuid, scryfallId, rarity, foil, price FROM booster_cards ORDER BY booster_id, position') if set_code is None \
+                   else conn.execute('SELECT booster_id, name, uuid, scryfallId, rarity, foil, price FROM booster_cards WHERE setCode=? ORDER BY booster_id, position', (set_code,))
+            for booster_id, name, uuid, scryfallId, rarity, foil, price in card_rows:
+                cards.setdefault(booster_id, []).append({'name':name, 'uuid':uuid, 'scryfallId':scryfallId, 'rarity':rarity, 'foil':bool(foil), 'price':price})
+        for booster_id, generated_at, set_name, setCode, releaseDate, type_, total in booster_rows:
+            # boosters generated in the same second (i.e. bulk generation) would share a key
+            if generated_at in boosters: generated_at = generated_at+'.'+str(booster_id)
+            boosters[generated_at] = {'set':set_name, 'setCode':setCode, 'releaseDate':releaseDate, 'type':type_,
+                                      'cards':cards.get(booster_id, []), 'boosterTotalValue':total}
+        return boosters
+
+    # writes the history in the old boosters.json format
+    def export_json(self, json_file:str=None):
+        if json_file is None: json_file = self.json_file
+        with open(json_file, 'w') as fp:
+            json.dump(self.get_boosters(), fp, indent = 4)
+        return json_file
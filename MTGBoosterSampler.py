@@ -0,0 +1,141 @@
+######################################################################################################
+# Imports
+from dataclasses import dataclass
+import numpy as np
+from MTGCard import MTGCard
+from MTGCardStore import MTGStoredSet, FLAG_BASIC_LAND
+from MTGSetIndex import BOOSTER_KEY_ORDER
+
+# Many boosters of one set and distribution, as arrays of rows of the set's
+# card store table (-1 pads boosters smaller than the biggest one)
+@dataclass
+class MTGBoosterBatch:
+
+    set_code:str
+    booster_distribution:str
+    cards:np.ndarray    # (boosters, cards per booster) int32
+    foil:np.ndarray     # (boosters, cards per booster) bool
+    variant:np.ndarray  # (boosters,) index of the weighted booster layout picked
+
+    def __init__(self, stored_set:MTGStoredSet, booster_distribution:str, cards:np.ndarray, foil:np.ndarray, variant:np.ndarray):
+        self.stored_set = stored_set
+        self.set_code = stored_set.set_code
+        self.booster_distribution = booster_distribution
+        self.cards = cards
+        self.foil = foil
+        self.variant = variant
+        self.values = None # total value per booster, set when prices were requested
+
+    def __len__(self):
+        return len(self.cards)
+
+    # card store rows used anywhere in the batch
+    def get_unique_rows(self)->np.ndarray:
+        rows = np.unique(self.cards)
+        return rows[rows>=0]
+
+    def get_booster_rows(self, booster:int)->list[tuple]:
+        mask = self.cards[booster]>=0
+        return list(zip(self.cards[booster][mask].tolist(), self.foil[booster][mask].tolist()))
+
+    # full MTGCard objects of a single booster
+    def get_booster(self, booster:int, queue_=None)->list[MTGCard]:
+        return [MTGCard(self.stored_set.get_card_json(row), queue_, foil=foil) for row, foil in self.get_booster_rows(booster)]
+
+    # value of every booster from per row price arrays (i.e. usd and usd_foil of the whole set)
+    def get_values(self, usd:np.ndarray, usd_foil:np.ndarray)->np.ndarray:
+        mask = self.cards>=0
+        rows = np.where(mask, self.cards, 0)
+        prices = np.where(self.foil, usd_foil[rows], usd[rows])
+        return np.where(mask, prices, 0.0).sum(axis=1)
+
+# Vectorized booster generation over the compiled card store (weighted booster
+# layout, sheet weights, older sets without sheets). Draws all boosters at once
+# with numpy; MTGJson.generate_booster draws single boosters with it too
+class MTGBoosterSampler:
+
+    def __init__(self, stored_set:MTGStoredSet):
+        self.stored_set = stored_set
+        self.plans = {}
+
+    def __get_rarity_rows__(self, rarity:str, basic_land:bool)->np.ndarray:
+        rarities = self.stored_set.meta['rarities']
+        if rarity not in rarities: return np.zeros(0, dtype=np.int32)
+        cards = self.stored_set.cards
+        is_basic = (cards['flags'] & FLAG_BASIC_LAND)>0
+        return np.nonzero((cards['rarity']==rarities.index(rarity)) & (is_basic==basic_land))[0].astype(np.int32)
+
+    # [(weight, [(card rows repeated by weight, count, foil), ...]), ...] per booster layout
+    def __get_plan__(self, booster_distribution:str)->list:
+        if booster_distribution in self.plans: return self.plans[booster_distribution]
+        distributions = self.stored_set.meta['distributions']
+        if booster_distribution not in distributions: raise KeyError(booster_distribution)
+        d = distributions.index(booster_distribution)
+        sheet_names = self.stored_set.meta['sheets'][d]
+        sheet_groups = self.stored_set.get_sheet_groups()
+        boosters = self.stored_set.boosters[self.stored_set.boosters['distribution']==d]
+        basic_lands = np.nonzero(self.stored_set.cards['flags'] & FLAG_BASIC_LAND)[0].astype(np.int32)
+        plan = []
+        for b in np.unique(boosters['booster']):
+            rows = boosters[boosters['booster']==b]
+            contents = {sheet_names[r['sheet']][0]:(int(r['sheet']), int(r['count'])) for r in rows}
+            segments = []
+            for key in BOOSTER_KEY_ORDER:
+                if key not in contents: continue
+                s, count = contents[key]
+                # Distribution for newer sets
+                if 'basic' in contents:
+                    sheet = sheet_groups.get((d, s), self.stored_set.sheets[:0])
+                    sheet = sheet[sheet['card']>=0]
+                    # cards listed in a sheet but missing from the set can not be drawn
+                    segments.append((np.repeat(sheet['card'], sheet['weight']), count, key=='foil'))
+                # Distribution for older sets
+                elif key in ['common', 'uncommon', 'rare']:
+                    if key=='common' and len(basic_lands)>0:
+                        segments.append((basic_lands, 1, False))
+                        count -= 1
+                    segments.append((self.__get_rarity_rows__(key, False), count, False))
+            plan.append((int(rows[0]['weight']), segments))
+        self.plans[booster_distribution] = plan
+        return plan
+
+    # k distinct positions out of population for each of m boosters, (m, k)
+    def __sample_positions__(self, rng:np.random.Generator, population:int, k:int, m:int)->np.ndarray:
+        if k > population: raise ValueError('Sample larger than population')
+        if k*k > population:
+            # repeats are likely (birthday bound): shuffle every booster's positions,
+            # a block of boosters at a time to bound memory
+            positions = np.empty((m, k), dtype=np.int64)
+            block = max(1, (1<<22)//population)
+            for start in range(0, m, block):
+                end = min(m, start+block)
+                positions[start:end] = rng.permuted(np.tile(np.arange(population), (end-start, 1)), axis=1)[:, :k]
+            return positions
+        positions = rng.integers(0, population, size=(m, k))
+        if k==1: return positions
+        # repeats are rare (k*k <= population), draw again the few boosters that got one
+        while True:
+            sorted_positions = np.sort(positions, axis=1)
+            repeated = (sorted_positions[:, 1:]==sorted_positions[:, :-1]).any(axis=1)
+            if not repeated.any(): return positions
+            positions[repeated] = rng.integers(0, population, size=(int(repeated.sum()), k))
+
+    def sample(self, booster_distribution:str, n:int, seed=None)->MTGBoosterBatch:
+        rng = np.random.default_rng(seed)
+        plan = self.__get_plan__(booster_distribution)
+        weights = np.array([weight for weight, _ in plan], dtype=np.float64)
+        variant = rng.choice(len(plan), size=n, p=weights/weights.sum())
+        booster_size = max([sum(count for _, count, _ in segments) for _, segments in plan])
+        cards = np.full((n, booster_size), -1, dtype=np.int32)
+        foil = np.zeros((n, booster_size), dtype=bool)
+        for v, (_, segments) in enumerate(plan):
+            boosters = np.nonzero(variant==v)[0]
+            if len(boosters)==0: continue
+            column = 0
+            for rows, count, is_foil in segments:
+                if count<=0: continue
+                positions = self.__sample_positions__(rng, len(rows), count, len(boosters))
+                cards[boosters, column:column+count] = rows[positions]
+                foil[boosters, column:column+count] = is_foil
+                column += count
+        return MTGBoosterBatch(self.stored_set, booster_distribution, cards, foil, variant)
@@ -16,6 +16,11 @@ import json
 from PIL import Image
 import requests
 import os
+from MTGPriceStore import price_store
+from MTGResources import resources
+from MTGImageCache import image_cache
+from MTGMetrics import metrics
+from MTGEvents import STATUS
 
 @dataclass
 class MTGCard:
@@ -28,24 +33,27 @@ class MTGCard:
     scryfallId:str
     image_url:str
     image_resolution:str
-    image:Image
+    image_key:tuple
     foil:bool
     price:float
     newly_collected:bool
 
+    cache_dir_checked = False
+
     def __init__(self, card_json_data:json, queue_:queue=None, foil:bool=False, collected:bool=True):
         self.image_resolution = 'normal' #small, normal, large, png, art_crop, or border_crop. Defaults to large.
         self.cache_dir_img = './cache/img/'
+        self.cache_dir_thumbs = self.cache_dir_img+'thumbs/'
         self.cache_dir_meta = './cache/metadata/'
         self.res_dir = './res/'
         self.file_extension = '.png'
-        self.prices_json_file = 'prices.json'
         self.prices_json = None
         self.queue_ = queue_
         self.foil = foil
         self.price = 0.0
         self.collected = collected
         self.newly_collected=False
+        self.image_key = None
         self.card_print_separator = '--------------------------------------------------'
         if card_json_data is not None:
             self.uuid = card_json_data['uuid']
@@ -56,64 +64,108 @@ class MTGCard:
             self.price_url = 'https://api.scryfall.com/cards/'+self.scryfallId
             self.rarity = card_json_data['rarity']
             self.type = card_json_data['type']
-        if not os.path.isdir(self.cache_dir_img): os.makedirs(self.cache_dir_img)
+        # checked once per process, not for every card
+        if not MTGCard.cache_dir_checked:
+            if not os.path.isdir(self.cache_dir_img): os.makedirs(self.cache_dir_img)
+            MTGCard.cache_dir_checked = True
+
+    # pixels live in the shared image cache, the card only keeps the key
+    @property
+    def image(self)->Image.Image:
+        if self.image_key is None: return None
+        img = image_cache.peek(self.image_key)
+        # evicted, decode again
+        if img is None: img = self.__get_image__()
+        return img
+
+    def __get_image__(self, session:requests.Session=None):
+        # decoded once per process and shared by every card with the same scryfallId
+        if image_cache.peek((self.scryfallId, 'base', None)) is not None: metrics.increment('images.memory')
+        base = image_cache.get((self.scryfallId, 'base', None), lambda: self.__load_image__(session))
+        if base is None:
+            self.image_key = ('card-back', 'base', (488,680))
+            return image_cache.get(self.image_key, lambda: Image.open('./res/mtg-card-back.png').resize((488,680)))
+        # overlays are composited once per scryfallId and size
+        img = resources.get_composite(self.scryfallId, base, self.foil, self.newly_collected)
+        self.image_key = (self.scryfallId, resources.get_variant(self.foil, self.newly_collected), None)
+        return img
+
+    # card image resized to size, kept in the image cache as its own entry
+    def get_image(self, size:tuple=None)->Image.Image:
+        img = self.image if self.image_key is not None else self.__get_image__()
+        if size is None or img.size==tuple(size): return img
+        return image_cache.get(self.image_key[:2]+(tuple(size),), lambda: img.resize(size))
 
-    def __get_image__(self):
+    # card image decoded at size, for pages that show many cards. The resized image is
+    # persisted in cache/img/thumbs/, so the full size image is only decoded once
+    def get_thumbnail(self, size:tuple, session:requests.Session=None)->Image.Image:
+        size = tuple(size)
+        if image_cache.peek((self.scryfallId, 'base', size)) is not None: metrics.increment('images.memory')
+        base = image_cache.get((self.scryfallId, 'base', size), lambda: self.__load_thumbnail__(size, session))
+        if base is None:
+            return image_cache.get(('card-back', 'base', size), lambda: Image.open(self.res_dir+'mtg-card-back.png').resize(size))
+        return resources.get_composite(self.scryfallId, base, self.foil, self.newly_collected, size)
+
+    def __load_thumbnail__(self, size:tuple, session:requests.Session=None):
+        thumbnail_file = self.cache_dir_thumbs+self.scryfallId+'_'+str(size[0])+'x'+str(size[1])+self.file_extension
+        if os.path.isfile(thumbnail_file):
+            metrics.increment('images.thumbnail')
+            return Image.open(thumbnail_file)
+        img = self.__load_image__(session)
+        if img is None: return None
+        # reduce by an integer factor first (fast), then resample to the exact size
+        img = img.resize(size, reducing_gap=2.0)
+        if not os.path.isdir(self.cache_dir_thumbs): os.makedirs(self.cache_dir_thumbs)
+        img.save(thumbnail_file)
+        return img
+
+    # image as downloaded, from cache/img or Scryfall (None if it can't be downloaded).
+    # Counted as images.disk / images.network / images.failed
+    def __load_image__(self, session:requests.Session=None):
         if(os.path.isfile(self.cache_dir_img+self.scryfallId+self.file_extension)):
-            img = Image.open(self.cache_dir_img+self.scryfallId+self.file_extension)
-            if self.foil:
-                img = self.__apply_foil__(img)
-            if self.newly_collected:
-                img = self.__apply_new_sticker__(img)
-        else:
-            msg = 'Image ['+self.name+'] not in cache. Fetching from '+self.image_url
-            print(msg, end=' ')
-            if self.queue_ is not None: self.queue_.put((0,msg))
-            try:
-                img = Image.open(requests.get(self.image_url, stream=True).raw)
-                if self.foil: img = self.__apply_foil__(img)
-                #should not apply new sticker here
+            metrics.increment('images.disk')
+            return Image.open(self.cache_dir_img+self.scryfallId+self.file_extension)
+        msg = 'Image ['+self.name+'] not in cache. Fetching from '+self.image_url
+        print(msg, end=' ')
+        if self.queue_ is not None: self.queue_.put((STATUS,msg))
+        try:
+            with metrics.span('images.download'):
+                img = Image.open((session if session is not None else requests).get(self.image_url, stream=True).raw)
+                #should not apply foil or new sticker here, other copies of the card share the file
                 img.save(self.cache_dir_img+self.scryfallId+self.file_extension)
-                msg = 'OK!'
-                print(msg)
-                if self.queue_ is not None: self.queue_.put((0,msg))
-                if self.newly_collected:
-                    img = self.__apply_new_sticker__(img)
-            except:
-                print('NOK')
-                if self.queue_ is not None: self.queue_.put((0,'Error downloading...'))
-                img = Image.open('./res/mtg-card-back.png').resize((488,680))
-        self.image = img
-        return img
+            metrics.increment('images.network')
+            msg = 'OK!'
+            print(msg)
+            if self.queue_ is not None: self.queue_.put((STATUS,msg))
+            return img
+        except:
+            metrics.increment('images.failed')
+            print('NOK')
+            if self.queue_ is not None: self.queue_.put((STATUS,'Error downloading...'))
+            return None
 
     def __get_price__(self):
-        prices = {}
-        if not os.path.isfile(self.cache_dir_meta+self.prices_json_file):
-            with open(self.cache_dir_meta+self.prices_json_file, 'w') as fp:
-                json.dump(prices, fp, indent = 4)
-        else:
-            with open(self.cache_dir_meta+self.prices_json_file, 'r') as file:
-                prices = json.loads(file.read())
         # From cache
-        if self.scryfallId in prices:
-            self.prices_json = prices[self.scryfallId]
+        self.prices_json = price_store.get(self.scryfallId)
         # From API
-        else:
+        if self.prices_json is None:
             msg = 'Price of ['+self.name+'] not in cache. Fetching from '+self.price_url
             print(msg, end=' ')
-            if self.queue_ is not None: self.queue_.put((0,msg))
-            card_json = requests.get(self.price_url, stream=True).json()
-            msg = 'OK!'
+            if self.queue_ is not None: self.queue_.put((STATUS,msg))
+            try:
+                with metrics.span('prices.download'):
+                    card_json = requests.get(self.price_url, stream=True).json()
+                metrics.increment('prices.network')
+                # buffered, written when the booster/collection is done (price_store.flush())
+                self.prices_json = price_store.put(self.scryfallId, card_json['prices']['usd'], card_json['prices']['usd_foil'])
+                msg = 'OK!'
+            except:
+                # keep using an expired price if there is one
+                self.prices_json = price_store.get(self.scryfallId, include_expired=True)
+                if self.prices_json is None: raise
+                msg = 'NOK, using expired price'
             print(msg)
-            if self.queue_ is not None: self.queue_.put((0,msg))
-            card_json_light = {}
-            card_json_light['usd_foil'] = card_json['prices']['usd_foil']
-            card_json_light['usd'] = card_json['prices']['usd']
-            prices[self.scryfallId] = card_json_light
-            self.prices_json = card_json_light
-            # Save
-            with open(self.cache_dir_meta+self.prices_json_file, 'w') as fp:
-                json.dump(prices, fp, indent = 4)
+            if self.queue_ is not None: self.queue_.put((STATUS,msg))
         if self.foil: p = self.prices_json['usd_foil']
         else: p = self.prices_json['usd']
         if p is not None: self.price = float(p)
@@ -121,20 +173,10 @@ class MTGCard:
         return self.price
 
     def __apply_foil__(self, img):
-        foil_layer = Image.open(self.res_dir+'foil_layer3.png')
-        foil_layer = foil_layer.resize(img.size)
-        foil_layer = foil_layer.convert("RGBA")
-        foil_layer.putalpha(64)
-        img = img.convert("RGBA")
-        foil_image = Image.new("RGBA", img.size)
-        foil_image = Image.alpha_composite(foil_image, img)
-        foil_image = Image.alpha_composite(foil_image, foil_layer)
-        return foil_image
+        return resources.apply_foil(img)
 
     def __apply_new_sticker__(self, img):
-        self.new_sticker_img = Image.open(self.res_dir+'new'+self.file_extension).convert('RGBA')
-        img.paste(self.new_sticker_img, (img.size[0]-self.new_sticker_img.size[0],0), self.new_sticker_img)
-        return img
+        return resources.apply_new_sticker(img)
 
     def __str__(self):
         ret = self.card_print_separator
@@ -0,0 +1,73 @@
+######################################################################################################
+# Imports
+import json
+from queue import Queue
+from MTGCard import MTGCard
+
+# Compact card used where many cards are handled at once (collections, bulk
+# generation). Only the card's own fields are stored; urls and paths are derived
+# when asked for. to_card() builds the full MTGCard when the card is displayed
+class MTGCardRecord:
+
+    __slots__ = ('uuid', 'name', 'set_code', 'scryfallId', 'rarity', 'type', 'foil', 'collected', 'newly_collected', 'price', 'owned', 'foils')
+
+    cache_dir_img = './cache/img/'
+    file_extension = '.png'
+    image_resolution = 'normal'
+
+    def __init__(self, uuid:str, name:str, set_code:str, scryfallId:str, rarity:str, type_:str, foil:bool=False, collected:bool=True):
+        self.uuid = uuid
+        self.name = name
+        self.set_code = set_code
+        self.scryfallId = scryfallId
+        self.rarity = rarity
+        self.type = type_
+        self.foil = foil
+        self.collected = collected
+        self.newly_collected = False
+        self.price = 0.0
+        # copies collected (all and foil only)
+        self.owned = 0
+        self.foils = 0
+
+    @classmethod
+    def from_json(cls, card_json_data:json, foil:bool=False, collected:bool=True):
+        return cls(card_json_data['uuid'], card_json_data['name'], card_json_data['setCode'], card_json_data['identifiers']['scryfallId'],
+                   card_json_data['rarity'], card_json_data['type'], foil, collected)
+
+    # one record per card of a compiled set, read from its columns (no per card json)
+    @classmethod
+    def from_stored_set(cls, stored_set, foil:bool=False, collected:bool=True)->list:
+        cards = stored_set.cards
+        rarities = stored_set.meta['rarities']
+        names = stored_set.get_strings(cards['name_offset'], cards['name_length'])
+        types = stored_set.get_strings(cards['type_offset'], cards['type_length'])
+        return [cls(uuid, name, set_code, scryfallId, rarities[rarity], type_, foil, collected)
+                for uuid, name, set_code, scryfallId, rarity, type_ in zip(stored_set.get_column('uuid'), names, stored_set.get_column('setCode'),
+                                                                          stored_set.get_column('scryfallId'), cards['rarity'].tolist(), types)]
+
+    @property
+    def image_url(self)->str:
+        return 'https://api.scryfall.com/cards/'+self.scryfallId+'?format=image&face=front&version='+self.image_resolution
+
+    @property
+    def price_url(self)->str:
+        return 'https://api.scryfall.com/cards/'+self.scryfallId
+
+    @property
+    def image_file(self)->str:
+        return self.cache_dir_img+self.scryfallId+self.file_extension
+
+    def to_json(self)->dict:
+        return {'uuid':self.uuid, 'name':self.name, 'setCode':self.set_code, 'identifiers':{'scryfallId':self.scryfallId},
+                'rarity':self.rarity, 'type':self.type}
+
+    def to_card(self, queue_:Queue=None)->MTGCard:
+        card = MTGCard(self.to_json(), queue_, foil=self.foil, collected=self.collected)
+        card.newly_collected = self.newly_collected
+        card.price = self.price
+        return card
+
+    def __repr__(self):
+        if self.foil: return '*'+self.name+'*'
+        else: return self.name
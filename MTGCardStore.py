@@ -0,0 +1,256 @@
+######################################################################################################
+# Imports
+from dataclasses import dataclass
+import json
+import os
+from queue import Queue
+import shutil
+import time
+import numpy as np
+from MTGDatabase import MTGDatabase
+from MTGEvents import STATUS, PROGRESS
+
+# Per card flags
+FLAG_BASIC_LAND = 1
+FLAG_LAND = 2
+
+CARD_DTYPE = np.dtype([('uuid','S36'),
+                       ('scryfallId','S36'),
+                       ('setCode','S8'),
+                       ('name_offset','u4'),('name_length','u2'),
+                       ('type_offset','u4'),('type_length','u2'),
+                       ('rarity','u1'),
+                       ('flags','u1')])
+
+# one row per card in a sheet, 'card' is the row in the cards table (-1 if not in this set)
+SHEET_DTYPE = np.dtype([('distribution','u2'),('sheet','u2'),('card','i4'),('uuid','S36'),('weight','u4')])
+
+# one row per (booster, sheet) pair of a distribution
+BOOSTER_DTYPE = np.dtype([('distribution','u2'),('booster','u2'),('weight','u4'),('sheet','u2'),('count','u2')])
+
+# A single compiled set opened from disk. Tables are memory mapped, so
+# opening a set only reads the small meta file. meta.json names the tables
+# directory of the current version (<SET>/<version>/)
+@dataclass
+class MTGStoredSet:
+
+    set_code:str
+    meta:dict
+
+    def __init__(self, store_dir:str):
+        self.store_dir = store_dir
+        with open(store_dir+'meta.json', 'r', encoding='UTF-8') as f: self.meta = json.load(f)
+        self.set_code = self.meta['code']
+        # stores compiled before versioned tables keep them next to meta.json
+        self.tables_dir = store_dir+self.meta['tables']+'/' if 'tables' in self.meta else store_dir
+        self.cards = self.__open_table__('cards.npy')
+        self.sheets = self.__open_table__('sheets.npy')
+        self.boosters = self.__open_table__('boosters.npy')
+        strings_file = self.tables_dir+'strings.bin'
+        self.strings = np.memmap(strings_file, dtype=np.uint8, mode='r') if os.path.getsize(strings_file)>0 else np.zeros(0, dtype=np.uint8)
+        self.sheet_groups = None # (distribution, sheet) -> sheets rows, built on first use
+
+    def __open_table__(self, file_name:str):
+        # np.load with mmap_mode returns a np.memmap over the .npy payload
+        return np.load(self.tables_dir+file_name, mmap_mode='r')
+
+    def __len__(self):
+        return len(self.cards)
+
+    def get_string(self, offset:int, length:int)->str:
+        return bytes(self.strings[offset:offset+length]).decode('UTF-8')
+
+    # strings of many rows at once (i.e. every card name), decoding the string table once
+    def get_strings(self, offsets:np.ndarray, lengths:np.ndarray)->list[str]:
+        strings = bytes(self.strings)
+        return [strings[offset:offset+length].decode('UTF-8') for offset, length in zip(offsets.tolist(), lengths.tolist())]
+
+    # a text column of the cards table (uuid, scryfallId, setCode) as a list of str
+    def get_column(self, name:str)->list[str]:
+        return np.char.decode(self.cards[name], 'UTF-8').tolist()
+
+    def get_booster_distribution_values(self)->list[str]:
+        return self.meta['distributions']
+
+    def get_card_json(self, row:int)->dict:
+        card = self.cards[row]
+        return {'uuid':card['uuid'].decode(),
+                'name':self.get_string(int(card['name_offset']), int(card['name_length'])),
+                'setCode':card['setCode'].decode(),
+                'identifiers':{'scryfallId':card['scryfallId'].decode()},
+                'rarity':self.meta['rarities'][card['rarity']],
+                'type':self.get_string(int(card['type_offset']), int(card['type_length']))}
+
+    # sheets table rows grouped by (distribution, sheet), in one sort of the table.
+    # Rows keep their order inside a group
+    def get_sheet_groups(self)->dict:
+        if self.sheet_groups is None:
+            order = np.lexsort((self.sheets['sheet'], self.sheets['distribution']))
+            sheets = self.sheets[order]
+            keys = sheets['distribution'].astype(np.uint32)<<16 | sheets['sheet']
+            starts = np.flatnonzero(np.r_[True, keys[1:]!=keys[:-1]]) if len(keys)>0 else np.zeros(0, dtype=np.int64)
+            ends = np.append(starts[1:], len(keys))
+            self.sheet_groups = {(int(sheets[start]['distribution']), int(sheets[start]['sheet'])):sheets[start:end] for start, end in zip(starts, ends)}
+        return self.sheet_groups
+
+    # rebuilds the parts of the set json file this application uses. Only for
+    # compatibility and debugging, the application reads the tables directly
+    def to_set_json(self)->dict:
+        data = {}
+        for key in ['name', 'code', 'releaseDate', 'type']: data[key] = self.meta[key]
+        data['cards'] = [self.get_card_json(row) for row in range(len(self.cards))]
+        data['booster'] = {}
+        sheet_names = self.meta['sheets']
+        sheet_groups = self.get_sheet_groups()
+        for d, distribution in enumerate(self.meta['distributions']):
+            sheets = {}
+            for s, (sheet_name, foil) in enumerate(sheet_names[d]):
+                # sheets without cards only exist as booster contents of older sets
+                rows = sheet_groups.get((d, s))
+                if rows is None: continue
+                sheets[sheet_name] = {'cards':{r['uuid'].decode():int(r['weight']) for r in rows}, 'foil':foil}
+            boosters = {}
+            for r in self.boosters[self.boosters['distribution']==d]:
+                booster = boosters.setdefault(int(r['booster']), {'contents':{}, 'weight':int(r['weight'])})
+                booster['contents'][sheet_names[d][r['sheet']][0]] = int(r['count'])
+            data['booster'][distribution] = {'boosters':[boosters[b] for b in sorted(boosters)], 'sheets':sheets}
+        return {'data':data}
+
+# Compiles the database set json files into a compact columnar store
+# (./cache/store/<SET>/) and opens compiled sets
+class MTGCardStore:
+
+    def __init__(self, cache_dir_meta:str='./cache/metadata/', cache_dir_store:str='./cache/store/', queue_:Queue=None, database:MTGDatabase=None):
+        self.cache_dir_meta = cache_dir_meta
+        self.cache_dir_store = cache_dir_store
+        self.file_extension = '.json'
+        self.queue_ = queue_
+        self.database = database if database is not None else MTGDatabase(cache_dir_meta)
+
+    def __get_set_dir__(self, set_code:str):
+        return self.cache_dir_store+set_code+'/'
+
+    def is_compiled(self, set_code:str)->bool:
+        meta_file = self.__get_set_dir__(set_code)+'meta.json'
+        if not os.path.isfile(meta_file): return False
+        # only sets whose file content changed in a database refresh are compiled again
+        try:
+            with open(meta_file, 'r', encoding='UTF-8') as f: meta = json.load(f)
+        except:
+            return False
+        # stores without versioned tables are compiled again
+        if 'tables' not in meta: return False
+        return meta.get('source_hash') == self.database.get_set_hash(set_code)
+
+    def compile_all(self, set_codes:list[str], force:bool=False):
+        for i, set_code in enumerate(set_codes):
+            if not force and self.is_compiled(set_code): continue
+            if self.queue_ is not None:
+                self.queue_.put((STATUS,'Compiling set ['+set_code+'] '+str(i+1)+'/'+str(len(set_codes))+'...'))
+                self.queue_.put((PROGRESS,('compile', i+1, len(set_codes))))
+            try:
+                self.compile_set(set_code)
+            except Exception as e:
+                print(f'Could not compile set [{set_code}]: {e}')
+
+    def compile_set(self, set_code:str):
+        source_hash = self.database.get_set_hash(set_code)
+        set_json_data = json.loads(self.database.read_set_file(set_code))
+        self.compile_set_json(set_json_data, set_code, source_hash)
+
+    def compile_set_json(self, set_json_data:dict, set_code:str=None, source_hash:str=None):
+        data = set_json_data['data']
+        if set_code is None: set_code = data['code']
+        set_dir = self.__get_set_dir__(set_code)
+        if not os.path.isdir(set_dir): os.makedirs(set_dir)
+        #######################################################################
+        # cards and string table
+        strings = bytearray()
+        def add_string(text:str):
+            encoded = (text or '').encode('UTF-8')
+            offset = len(strings)
+            strings.extend(encoded)
+            return offset, len(encoded)
+        rarities = []
+        cards = np.zeros(len(data['cards']), dtype=CARD_DTYPE)
+        rows = {}
+        for row, card in enumerate(data['cards']):
+            if card['rarity'] not in rarities: rarities.append(card['rarity'])
+            flags = 0
+            if 'Basic Land' in card['type']: flags |= FLAG_BASIC_LAND
+            if 'Land' in card['type']: flags |= FLAG_LAND
+            name_offset, name_length = add_string(card['name'])
+            type_offset, type_length = add_string(card['type'])
+            cards[row] = (card['uuid'], card['identifiers'].get('scryfallId',''), card['setCode'],
+                          name_offset, name_length, type_offset, type_length, rarities.index(card['rarity']), flags)
+            rows[card['uuid']] = row
+        #######################################################################
+        # booster sheets
+        distributions = list(data.get('booster', {}).keys())
+        sheet_names = []
+        sheet_rows = []
+        booster_rows = []
+        for d, distribution in enumerate(distributions):
+            booster_data = data['booster'][distribution]
+            names = list(booster_data['sheets'].keys())
+            sheet_names.append([(name, booster_data['sheets'][name].get('foil', False)) for name in names])
+            for s, name in enumerate(names):
+                for uuid, weight in booster_data['sheets'][name]['cards'].items():
+                    sheet_rows.append((d, s, rows.get(uuid, -1), uuid, weight))
+            for b, booster in enumerate(booster_data['boosters']):
+                for name, count in booster['contents'].items():
+                    # older sets have contents without matching sheets (common/uncommon/rare)
+                    if name not in names:
+                        names.append(name)
+                        sheet_names[d].append((name, False))
+                    booster_rows.append((d, b, booster['weight'], names.index(name), count))
+        #######################################################################
+        # save. Tables go to a new version directory, sets opened before (memory
+        # mapping the previous version) keep working. meta.json is replaced last and
+        # atomically, its mtime marks the store as complete
+        tables = 'v'+str(time.time_ns())
+        tables_dir = set_dir+tables+'/'
+        os.makedirs(tables_dir)
+        np.save(tables_dir+'cards.npy', cards)
+        np.save(tables_dir+'sheets.npy', np.array(sheet_rows, dtype=SHEET_DTYPE))
+        np.save(tables_dir+'boosters.npy', np.array(booster_rows, dtype=BOOSTER_DTYPE))
+        with open(tables_dir+'strings.bin', 'wb') as f: f.write(strings)
+        meta = {'name':data['name'], 'code':data['code'], 'releaseDate':data.get('releaseDate'), 'type':data.get('type'),
+                'rarities':rarities, 'distributions':distributions, 'sheets':sheet_names, 'source_hash':source_hash, 'tables':tables}
+        with open(set_dir+'meta.json.tmp', 'w', encoding='UTF-8') as f: json.dump(meta, f)
+        os.replace(set_dir+'meta.json.tmp', set_dir+'meta.json')
+        self.__remove_old_tables__(set_dir, tables)
+
+    # versions older than tables (and tables of stores compiled before versioning). Newer
+    # ones may still be being written by another compile. Files still mapped by an open
+    # set can not be removed on some systems, they are left for the next compile
+    def __remove_old_tables__(self, set_dir:str, tables:str):
+        for f in os.listdir(set_dir):
+            path = set_dir+f
+            try:
+                if f.startswith('v') and f[1:].isdigit() and int(f[1:]) < int(tables[1:]): shutil.rmtree(path)
+                elif f in ['cards.npy', 'sheets.npy', 'boosters.npy', 'strings.bin']: os.remove(path)
+            except OSError:
+                pass
+
+    # compiles the set if needed, returns False if there is no such set
+    def __ensure_compiled__(self, set_code:str)->bool:
+        if not self.is_compiled(set_code):
+            if not self.database.has_set(set_code): return False
+            self.compile_set(set_code)
+        return True
+
+    # modification time of a compiled set, used to key in-memory caches
+    def get_set_mtime(self, set_code:str)->float:
+        if not self.__ensure_compiled__(set_code): return None
+        return os.path.getmtime(self.__get_set_dir__(set_code)+'meta.json')
+
+    def open_set(self, set_code:str)->MTGStoredSet:
+        if not self.__ensure_compiled__(set_code): return None
+        return MTGStoredSet(self.__get_set_dir__(set_code))
+
+    # set data rebuilt from the store (compatibility/debugging, see MTGStoredSet.to_set_json)
+    def load_set_json(self, set_code:str)->dict:
+        stored_set = self.open_set(set_code)
+        if stored_set is None: return None
+        return stored_set.to_set_json()
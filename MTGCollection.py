@@ -1,12 +1,43 @@
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
 import itertools
 import json
 from queue import Queue
-import numpy as np
 from PIL import Image
 from MTGCard import MTGCard
+from MTGCardRecord import MTGCardRecord
+from MTGSetIndex import MTGSetIndex, get_set_index
+from MTGCardStore import MTGCardStore
+from MTGBoosterHistory import MTGBoosterHistory
+from MTGImageFetcher import MTGImageFetcher
+from MTGImageCache import image_cache
+from MTGCollectionBook import MTGCollectionBook
+from MTGPageRenderer import MTGPageRenderer
+from MTGMetrics import metrics
 import math
 import os
+from MTGEvents import STATUS, INFO, PROGRESS
+
+######################################################################################################
+# Worker (runs in a separate process, gets card data and paths, returns raw pixels or the saved file)
+worker_renderers = {}
+
+def __render_page_worker__(set_code:str, thumbnails:bool, page_cache:bool, cache_dir_img:str, page_no:int, cards:list[tuple], out_file:str=None):
+    renderer = worker_renderers.get((set_code, thumbnails, page_cache))
+    if renderer is None:
+        renderer = MTGPageRenderer(set_code, thumbnails, page_cache)
+        worker_renderers[(set_code, thumbnails, page_cache)] = renderer
+    page_cards = []
+    for uuid, name, card_set_code, scryfallId, rarity, type_, collected, foil in cards:
+        card = MTGCardRecord(uuid, name, card_set_code, scryfallId, rarity, type_, foil, collected).to_card()
+        card.cache_dir_img = cache_dir_img
+        card.cache_dir_thumbs = cache_dir_img+'thumbs/'
+        page_cards.append(card)
+    page_img = renderer.get_page(page_cards, page_no)
+    if out_file is not None:
+        page_img.save(out_file)
+        return out_file
+    return (page_img.mode, page_img.size, page_img.tobytes())
 
 @dataclass
 class MTGCollection:
@@ -16,117 +47,111 @@ class MTGCollection:
     set_code:str
     queue_:Queue
 
-    def __init__(self, set_code:str, queue_:Queue=None):
+    def __init__(self, set_code:str, queue_:Queue=None, thumbnails:bool=True, page_cache:bool=True):
         self.set_code = set_code
-        self.cards_in_page = 15
-        self.card_dimensions = (488,680)
+        self.thumbnails = thumbnails
+        self.page_cache = page_cache
+        self.queue_ = queue_
+        self.image_fetcher = MTGImageFetcher(queue_=self.queue_)
+        # layout, compositor and page cache (what the page workers get, without the history)
+        self.renderer = MTGPageRenderer(set_code, thumbnails, page_cache, self.queue_, self.image_fetcher)
+        self.cards_in_page = self.renderer.cards_in_page
         self.cache_dir_meta = './cache/metadata/'
         self.boosters_json_file = 'boosters.json'
-        self.cache_dir_collections = './cache/collections/'+self.set_code+'/'
-        self.queue_ = queue_
+        self.boosters_db_file = 'boosters.db'
+        self.history = MTGBoosterHistory(self.cache_dir_meta+self.boosters_db_file, self.cache_dir_meta+self.boosters_json_file)
+        self.cache_dir_collections = self.renderer.cache_dir_collections
         self.page_image_list = []
+        self.page_summaries = {} # page -> phases of its last generation
 
-    def get_set_json(self):
-        with open(self.cache_dir_meta+self.set_code+'.json', 'r', encoding='UTF-8') as file:
-            set_json = json.loads(file.read())
-        return set_json
+    # index over the compiled set (None if there is no such set)
+    def get_set_index(self)->MTGSetIndex:
+        with metrics.span('collection.set_load'):
+            return get_set_index(MTGCardStore(self.cache_dir_meta), self.set_code)
 
     def get_booster_json(self):
-        with open(self.cache_dir_meta+self.boosters_json_file, 'r') as file:
-            boosters_json = json.loads(file.read())
-        return boosters_json
+        return self.history.get_boosters()
 
-    def get_collection(self, set_code:str, set_json:json):
-        #loads booster json file
-        boosters_json = self.get_booster_json()
-        collection = {}
-        #populate set data
-        for card_json_data in set_json['data']['cards']:
-            card = MTGCard(card_json_data, collected=False)
-            collection[card_json_data['uuid']] = card
+    def get_collection(self, set_code:str, set_index:MTGSetIndex):
+        with metrics.span('collection.history'):
+            #populate set data
+            # compact records read from the set's columns, MTGCard objects are only built for the cards shown on a page
+            collection = {card.uuid:card for card in MTGCardRecord.from_stored_set(set_index.stored_set, collected=False)}
 
-        #populate with collected cards
-        for booster_json in boosters_json.values():
-            if booster_json['setCode']==set_code:
-                for card_data in booster_json['cards']:
-                    if not collection[card_data['uuid']].foil:
-                        collection[card_data['uuid']].collected = True
-                        collection[card_data['uuid']].foil = card_data['foil']
+            #populate with collected cards (ownership index, foil if any copy is foil)
+            for uuid, (owned, foils, first_seen) in self.history.get_ownership(set_code).items():
+                card = collection.get(uuid)
+                if card is None: continue
+                card.collected = True
+                card.foil = foils > 0
+                card.owned = owned
+                card.foils = foils
         return collection
 
-    def __overlay_image__(self, l_img, s_img, x_offset, y_offset):
-        height = s_img.height #PIL
-        width = s_img.width #PIL
-        l_img[y_offset:y_offset+height, x_offset:x_offset+width] = s_img
-        return l_img
-
-    def __assemble__(self, card_image_list_as_image:list):
-        x_spacing = 50
-        y_spacing = 50
-        rows = [0,1,2]
-        cols = [0,1,2,3,4]
-        x_max = 0
-        y_max = 0
-        for card_image in card_image_list_as_image:
-            height = card_image.height #PIL
-            width = card_image.width #PIL
-            if x_max < height: x_max = height
-            if y_max < width: y_max = width
-        x_full_length = (x_max*len(rows))+(len(rows)*x_spacing)+x_spacing
-        y_full_length = (y_max*len(cols))+(len(cols)*y_spacing)+y_spacing
-        img = np.zeros([x_full_length,y_full_length,3],dtype=np.uint8)
-        #img.fill(255) #make image white
-        i=0
-        for col in cols:
-            for row in rows:
-                card_image = card_image_list_as_image[i]
-                height = card_image.height #PIL
-                width = card_image.width #PIL
-                x = x_spacing+(x_spacing*row)+(row*height)
-                y = y_spacing+(y_spacing*col)+(col*width)
-                img = self.__overlay_image__(img,card_image_list_as_image[i],y,x)
-                i+=1
-        img = Image.fromarray(img) #PIL
-        return img
+    def get_card_by_uuid(self, set_index:MTGSetIndex, uuid:str):
+        return MTGCard(set_index.get_card(uuid))
 
-    def get_card_by_uuid(self, set_json_data:json, uuid:str):
-        return MTGCard(list(filter(lambda card: (card['uuid'] == uuid), set_json_data['data']['cards']))[0])
-
-    def __generate_page__(self, collection:json, page:int, set_json_data:json):
-        msg = 'Generating page '+str(page)+'/'+str(math.ceil(len(collection)/self.cards_in_page))+'...'
+    def __generate_page__(self, collection:json, page:int, set_index:MTGSetIndex):
+        number_of_pages = math.ceil(len(collection)/self.cards_in_page)
+        msg = 'Generating page '+str(page)+'/'+str(number_of_pages)+'...'
         print(msg)
-        if self.queue_ is not None: self.queue_.put((1,msg))
+        if self.queue_ is not None: self.queue_.put((STATUS,msg))
         #card_uuids = list(collection.keys())
         collection_data = dict(itertools.islice(collection.items(), (page-1)*self.cards_in_page, page*self.cards_in_page ))
         #card_uuids = card_uuids[(page-1)*page_size:page*page_size]
-        card_image_list_as_image = []
-        card_back_img = Image.open('./res/mtg-card-back.png').resize(self.card_dimensions).convert("RGB")
-        for uuid, card in collection_data.items():
-            if card.collected:
-                if card.foil: card.foil = True
-                img = card.__get_image__().convert("RGB")
-                if img.size != self.card_dimensions: img = img.resize(self.card_dimensions)
-                card_image_list_as_image.append(img)
-            else:
-                card_image_list_as_image.append(card_back_img)
-        for i in range(self.cards_in_page-len(card_image_list_as_image)): card_image_list_as_image.append(card_back_img)
-        page_img = self.__assemble__(card_image_list_as_image)
-        page_img = page_img.resize((1100,900))
+        counters = metrics.snapshot()
+        page_img = self.renderer.get_page(list(collection_data.values()), page)
+        self.page_summaries[page] = ' | '.join(part for part in [metrics.summary('page.', since=counters), metrics.summary('images.', since=counters)] if part)
+        print('Timings: '+self.page_summaries[page])
         return page_img
 
-    def __generate_collection_book__(self, collection:json, set_json_data:json):
+    # collection book that renders pages on demand, keeping only `window` pages in memory
+    def get_collection_book(self, collection:json, set_index:MTGSetIndex, window:int=5)->MTGCollectionBook:
+        collection_book = MTGCollectionBook(self, collection, set_index, window)
+        msg = 'Collection Book.\nCards: '+str(len(collection))+'\nPages:' +str(len(collection_book))
+        print(msg)
+        if self.queue_ is not None: self.queue_.put((STATUS,msg))
+        return collection_book
+
+    # renders every page on a process pool and yields (page_no, page image) in page
+    # order as pages finish. Workers only get plain card data and cache paths; with
+    # out_dir, workers save the pages and the file names are yielded instead
+    def render_collection_book(self, collection:json, workers:int=None, out_dir:str=None):
+        cards = [(card.uuid, card.name, card.set_code, card.scryfallId, card.rarity, card.type, card.collected, card.foil) for card in collection.values()]
+        number_of_pages = math.ceil(len(cards)/self.cards_in_page)
+        cache_dir_img = MTGCardRecord.cache_dir_img
+        if out_dir is not None and not os.path.isdir(out_dir): os.makedirs(out_dir)
+        with ProcessPoolExecutor(max_workers=workers if workers is not None else (os.cpu_count() or 1)) as executor:
+            futures = []
+            for page_no in range(1, number_of_pages+1):
+                out_file = None if out_dir is None else os.path.join(out_dir, self.set_code+'_'+str(page_no)+'.png')
+                futures.append(executor.submit(__render_page_worker__, self.set_code, self.thumbnails, self.page_cache, cache_dir_img,
+                                               page_no, cards[(page_no-1)*self.cards_in_page:page_no*self.cards_in_page], out_file))
+            for page_no, future in enumerate(futures, start=1):
+                page = future.result()
+                if out_dir is None: page = Image.frombytes(page[0], page[1], page[2])
+                msg = 'Page '+str(page_no)+'/'+str(number_of_pages)+' ready'
+                print(msg)
+                if self.queue_ is not None:
+                    self.queue_.put((STATUS,msg))
+                    self.queue_.put((PROGRESS,('pages', page_no, number_of_pages)))
+                yield page_no, page
+
+    def __generate_collection_book__(self, collection:json, set_index:MTGSetIndex):
         collection_size = len(collection)
         number_of_pages = math.ceil(collection_size/self.cards_in_page)
         msg = 'Generating Collection Book.\nCards: '+str(collection_size)+'\nPages:' +str(number_of_pages)
         print(msg)
-        if self.queue_ is not None: self.queue_.put((1,msg))
+        if self.queue_ is not None: self.queue_.put((INFO,msg))
         if not os.path.isdir(self.cache_dir_collections): os.makedirs(self.cache_dir_collections)
         for page_no in range(1,number_of_pages+1):
-            page_img = self.__generate_page__(collection, page_no, set_json_data)
+            page_img = self.__generate_page__(collection, page_no, set_index)
             self.page_image_list.append(page_img)
             #save
             #file_name = self.cache_dir_collections+self.set_code+'_'+str(page_no)+'.png'
             #page_img.save(file_name)
+        print('Timings: '+metrics.summary('page.', field='total')+' | '+metrics.summary('images.'))
+        print(image_cache.summary())
         # opening first page to browse collection
         #TODO
         #?????
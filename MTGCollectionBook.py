@@ -0,0 +1,92 @@
+######################################################################################################
+# Imports
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+import math
+import threading
+from MTGEvents import INFO
+
+# Collection book rendered on demand. Pages are numbered from 1; a page is rendered
+# the first time it is requested (or prefetched in the background) and only the
+# last `window` pages used are kept in memory
+@dataclass
+class MTGCollectionBook:
+
+    number_of_pages:int
+    window:int
+
+    def __init__(self, mtg_collection, collection:dict, set_index, window:int=5, workers:int=1):
+        self.mtg_collection = mtg_collection
+        self.collection = collection
+        self.set_index = set_index
+        self.window = max(1, window)
+        self.number_of_pages = math.ceil(len(collection)/mtg_collection.cards_in_page)
+        self.pages = OrderedDict() # page_no -> image
+        self.pending = {} # page_no -> future
+        self.failed = {} # page_no -> error of its last render
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=max(1, workers))
+
+    def __len__(self):
+        return self.number_of_pages
+
+    def __iter__(self):
+        for page_no in range(1, self.number_of_pages+1):
+            yield self.get_page(page_no)
+
+    def __render__(self, page_no:int):
+        try:
+            page_img = self.mtg_collection.__generate_page__(self.collection, page_no, self.set_index)
+        except Exception as e:
+            # not kept as pending, the next request tries again. Reported on the
+            # collection's queue, nobody waits on a prefetched page's future
+            with self.lock:
+                self.pending.pop(page_no, None)
+                self.failed[page_no] = e
+            queue_ = self.mtg_collection.queue_
+            if queue_ is not None: queue_.put((INFO,'Error rendering page '+str(page_no)+': '+str(e)))
+            raise
+        with self.lock:
+            self.failed.pop(page_no, None)
+            self.pages[page_no] = page_img
+            self.pages.move_to_end(page_no)
+            self.pending.pop(page_no, None)
+            while len(self.pages) > self.window:
+                self.pages.popitem(last=False)
+        return page_img
+
+    def is_ready(self, page_no:int)->bool:
+        with self.lock:
+            return page_no in self.pages
+
+    # error of the page's last render if it failed (and was not requested again since)
+    def get_error(self, page_no:int)->Exception:
+        with self.lock:
+            return self.failed.get(page_no)
+
+    # renders pages in the background (pages out of range, cached or already pending are skipped)
+    def prefetch(self, page_nos:list[int]):
+        with self.lock:
+            for page_no in page_nos:
+                if not 1 <= page_no <= self.number_of_pages: continue
+                if page_no in self.pages or page_no in self.pending: continue
+                self.failed.pop(page_no, None)
+                self.pending[page_no] = self.executor.submit(self.__render__, page_no)
+
+    # page image, rendered now if it is not in memory (waits if it is being prefetched)
+    def get_page(self, page_no:int):
+        if not 1 <= page_no <= self.number_of_pages: raise IndexError('Page '+str(page_no)+' out of range')
+        with self.lock:
+            page_img = self.pages.get(page_no)
+            if page_img is not None:
+                self.pages.move_to_end(page_no)
+                return page_img
+            future = self.pending.get(page_no)
+        if future is not None: return future.result()
+        return self.__render__(page_no)
+
+    # stops background rendering (pages already in memory stay available)
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        with self.lock: self.pending.clear()
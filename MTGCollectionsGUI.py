@@ -18,10 +18,8 @@ import tkinter as tk
 import queue
 import threading
 from tkinter.font import BOLD
-from PIL import Image, ImageTk
-from MTGJson import MTGJson
-from MTGCard import MTGCard
-from MTGCollection import MTGCollection
+from MTGEvents import drain, coalesce, INFO, RESULT
+# PIL and the database modules are imported when first needed, so the window opens right away
 
 ######################################################################################################
 # Classes
@@ -30,18 +28,48 @@ from MTGCollection import MTGCollection
 # booster generation without freezing up UI
 class ThreadedTask(threading.Thread):
 
-    def __init__(self, queue_:queue, set_code:str):
+    def __init__(self, queue_:queue, set_code:str, pages_in_memory:int):
         threading.Thread.__init__(self)
         self.queue_ = queue_
         self.set_code = set_code
+        self.pages_in_memory = pages_in_memory
         
     def run(self):
+        from MTGCollection import MTGCollection
         c = MTGCollection(self.set_code, self.queue_)
-        set_json = c.get_set_json()
-        collection = c.get_collection(self.set_code, set_json)
-        collection_book_images = c.__generate_collection_book__(collection, set_json)
-        if collection_book_images is not None: self.queue_.put((2,(collection, c.page_image_list)))
-        else: self.queue_.put((1,'Error viewing Collection. Please try again.'))
+        set_index = c.get_set_index()
+        if set_index is None:
+            self.queue_.put((INFO,'Error viewing Collection. Please try again.'))
+            return
+        collection = c.get_collection(self.set_code, set_index)
+        collection_book = c.get_collection_book(collection, set_index, self.pages_in_memory)
+        # only the first page is rendered before showing the book
+        if len(collection_book) > 0 and collection_book.get_page(1) is not None: self.queue_.put((RESULT,(collection, collection_book)))
+        else: self.queue_.put((INFO,'Error viewing Collection. Please try again.'))
+
+# Threaded task to value the collection (all sets) without freezing up UI
+class ThreadedValuation(threading.Thread):
+
+    def __init__(self, queue_:queue, set_code:str):
+        threading.Thread.__init__(self, daemon=True)
+        self.queue_ = queue_
+        self.set_code = set_code
+
+    def run(self):
+        from MTGValuation import MTGValuation
+        try:
+            valuation = MTGValuation(queue_=self.queue_).value()
+        except Exception as e:
+            self.queue_.put((INFO,'Error valuing collection: '+str(e)))
+            return
+        set_worth = valuation['sets'].get(self.set_code, {'worth':0.0})['worth']
+        msg = 'Total collection worth: $ '+str("{:.2f}".format(set_worth))+' | All sets: $ '+str("{:.2f}".format(valuation['total']))+\
+              ' ('+str(len(valuation['sets']))+' sets, foil premium $ '+str("{:.2f}".format(valuation['foil_premium']))+')'
+        if len(valuation['top_cards']) > 0:
+            top_card = valuation['top_cards'][0]
+            msg += ' | Top card: '+top_card['name']+(' (foil)' if top_card['foil'] else '')+' $ '+str("{:.2f}".format(top_card['price']))
+        print(msg)
+        self.queue_.put((INFO,msg))
 
 ######################################################################################################
 # GUI
@@ -116,6 +144,10 @@ class MTGCollectionsGUI(tk.Frame):
                      'WC04', 'WC97', 'WC98', 'WC99', 'WDMU', 'WHO', 'WMC', 'WMOM', 'WONE', 'WTH', 'WWK', 'XANA', 'XLN', 
                      'YBRO', 'YDMU', 'YMID', 'YNEO', 'YONE', 'YSNC', 'ZEN', 'ZNC', 'ZNE', 'ZNR']
         self.display_index = 0
+        # pages kept in memory while browsing (current, previous and next at least)
+        self.pages_in_memory = 5
+        self.collection_book = None
+        self.pending_page = None
         self.done_processing = False
         self.__custom_init__()
         self.__align_elements__()
@@ -134,29 +166,46 @@ class MTGCollectionsGUI(tk.Frame):
     def __action_button_generate__(self):
         selected_set = self.stringvar_sets.get()
         if selected_set in self.SETS:
+            self.set_code = selected_set
             self.done_processing = False
             self.images.clear()
             self.display_index = 0
+            self.pending_page = None
+            if self.collection_book is not None: self.collection_book.close()
             self.__disable_buttons__()
             self.progress_bar.start()
-            ThreadedTask(self.queue_,selected_set).start()
+            ThreadedTask(self.queue_,selected_set,self.pages_in_memory).start()
         else:
             self.__put_text_in_status__('Error checking for collection. Ensure the set code is valid and try again.')
 
     def __action_button_next__(self):
-        if self.display_index < len(self.collection_book_images):
-            self.display_index+=1
-            img = self.collection_book_images[self.display_index]
-            self.__update_image__(self.label_img, img)
+        if self.collection_book is not None and self.display_index < len(self.collection_book)-1:
+            self.__show_page__(self.display_index+1)
     
     def __action_button_prev__(self):
-        if self.display_index > 0:
-            self.display_index-=1
-            img = self.collection_book_images[self.display_index]
-            self.__update_image__(self.label_img, img)
+        if self.collection_book is not None and self.display_index > 0:
+            self.__show_page__(self.display_index-1)
+
+    # shows a page if it is rendered, otherwise renders it in the background
+    # (__update_root__ shows it when ready). Neighbour pages are prefetched
+    def __show_page__(self, index:int):
+        self.display_index = index
+        page_no = index+1
+        if self.collection_book.is_ready(page_no):
+            self.pending_page = None
+            self.__update_image__(self.label_img, self.collection_book.get_page(page_no))
+            # where the page's time went (cache load or images/compose/save)
+            page_summary = self.collection_book.mtg_collection.page_summaries.get(page_no)
+            if page_summary: self.__put_text_in_status__('Page '+str(page_no)+'/'+str(len(self.collection_book))+' | '+page_summary)
+        else:
+            self.pending_page = page_no
+            self.collection_book.prefetch([page_no])
+            self.__put_text_in_status__('Loading page '+str(page_no)+'/'+str(len(self.collection_book))+'...')
+        self.collection_book.prefetch([page_no+1, page_no-1])
 
     # updates an image into UI Label
-    def __update_image__(self, label:Label, image:Image):
+    def __update_image__(self, label:Label, image:object):
+        from PIL import ImageTk
         img = ImageTk.PhotoImage(image)
         label.configure(image = img)
         label.image = img
@@ -168,41 +217,42 @@ class MTGCollectionsGUI(tk.Frame):
         self.textfield_status.insert(0,text)
         self.textfield_status.config(state='disabled')
 
-    def __done_processing__(self, collection:dict, collection_book_images:list):
+    def __done_processing__(self, collection:dict, collection_book:object):
         self.done_processing = True
-        img = collection_book_images[self.display_index]
-        self.__update_image__(self.label_img, img)
-        #TODO
-        total_worth = 0.0
-        for card in collection.values():
-            if card.collected:
-                total_worth+=card.__get_price__()
-        msg = 'Total collection worth: $ '+str("{:.2f}".format(total_worth))
-        print(msg)
-        self.queue_.put((1,msg))
+        self.collection_book = collection_book
+        self.__show_page__(self.display_index)
+        ThreadedValuation(self.queue_, self.set_code).start()
+
+    # handles a message from this window's channel
+    def __process_message__(self, msg:tuple):
+        #msg[0]==INFO only when info/error msg is passed
+        if(msg[0]==INFO):
+            self.progress_bar.stop()
+            self.progress_bar.config(value=0)
+            self.__enable_buttons__()
+        #msg[0]==RESULT only when booster is generated successfully
+        if(msg[0]==RESULT):
+            self.collection = msg[1][0]
+            self.__done_processing__(self.collection, msg[1][1])
 
-    # process messages on queue (shared with other classes)
-    def __process_queue__(self):
-        msg = None
-        if(self.queue_.empty()==False):
-            msg = self.queue_.get(0)
-            #msg[0]==1 only when info/error msg is passed
-            if(msg[0]==1):
-                self.progress_bar.stop()
-                self.__enable_buttons__()
-            #msg[0]==2 only when booster is generated successfully
-            if(msg[0]==2):
-                self.collection = msg[1][0]
-                self.collection_book_images = msg[1][1]
-                self.__done_processing__(self.collection, self.collection_book_images)
-        return msg
+    # progress of a phase (images, prices, pages...) as a determinate progress bar
+    def __update_progress__(self, phase:str, current:int, total:int):
+        self.progress_bar.stop()
+        self.progress_bar.config(maximum=max(total, 1), value=current)
     
-    # runs every 100ms to update UI elements
+    # runs every 100ms to update UI elements. Drains every pending message,
+    # status text and progress are only shown once (the last of each)
     def __update_root__(self):
         self.root.after(100, self.__update_root__)
-        if(self.queue_.empty()==False):
-            msg = self.__process_queue__()
-            if(msg[0]!=2): self.__put_text_in_status__(msg[1])
+        if self.pending_page is not None and self.collection_book.is_ready(self.pending_page):
+            self.__show_page__(self.pending_page-1)
+        # rendering failed (the error is on the queue), stop waiting for the page
+        elif self.pending_page is not None and self.collection_book.get_error(self.pending_page) is not None:
+            self.pending_page = None
+        events, status, progress = coalesce(drain(self.queue_))
+        for phase, current, total in progress: self.__update_progress__(phase, current, total)
+        for msg in events: self.__process_message__(msg)
+        if status is not None: self.__put_text_in_status__(status)
     
     def __custom_init__(self):
         #######################################################################
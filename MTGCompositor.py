@@ -0,0 +1,77 @@
+######################################################################################################
+# Imports
+from dataclasses import dataclass
+import threading
+from PIL import Image
+
+# Lays card images out on a grid (used by booster display and collection pages).
+# Cards fill the grid column by column (top to bottom, then left to right). Cell
+# size and spacing are multiplied by scale; images of another size are resized to
+# the cell. The canvas is allocated once and reused, pasting into it directly;
+# compose() returns a new image (a copy, or the canvas resized to output_size)
+@dataclass
+class MTGCompositor:
+
+    rows:int
+    cols:int
+    cell_size:tuple
+    spacing:int
+    scale:float
+    canvas_size:tuple
+    output_size:tuple
+
+    def __init__(self, rows:int=3, cols:int=5, cell_size:tuple=(488,680), spacing:int=50, scale:float=1.0, canvas_size:tuple=None, background:tuple=(0,0,0), output_size:tuple=None):
+        self.rows = rows
+        self.cols = cols
+        self.cell_size = tuple(cell_size)
+        self.spacing = spacing
+        self.scale = scale
+        # grid is centered on a canvas of this size (defaults to the grid size)
+        self.canvas_size = tuple(canvas_size) if canvas_size is not None else self.get_grid_size()
+        self.background = background
+        # composed images are resized to this size (defaults to the canvas size)
+        self.output_size = tuple(output_size) if output_size is not None else None
+        self.canvas = None
+        self.lock = threading.Lock()
+
+    # scale that makes a grid fit in size
+    @staticmethod
+    def get_fit_scale(rows:int, cols:int, cell_size:tuple, spacing:int, size:tuple)->float:
+        full_width = cols*cell_size[0]+(cols+1)*spacing
+        full_height = rows*cell_size[1]+(rows+1)*spacing
+        return min(size[0]/full_width, size[1]/full_height)
+
+    def get_cell_size(self)->tuple:
+        return (int(self.cell_size[0]*self.scale), int(self.cell_size[1]*self.scale))
+
+    def get_spacing(self)->int:
+        return int(self.spacing*self.scale)
+
+    def get_grid_size(self)->tuple:
+        cell_width, cell_height = self.get_cell_size()
+        spacing = self.get_spacing()
+        return (self.cols*cell_width+(self.cols+1)*spacing, self.rows*cell_height+(self.rows+1)*spacing)
+
+    # top left corner of the i-th card
+    def get_position(self, i:int)->tuple:
+        cell_width, cell_height = self.get_cell_size()
+        spacing = self.get_spacing()
+        grid_width, grid_height = self.get_grid_size()
+        row, col = i%self.rows, i//self.rows
+        return ((self.canvas_size[0]-grid_width)//2+spacing+col*(cell_width+spacing),
+                (self.canvas_size[1]-grid_height)//2+spacing+row*(cell_height+spacing))
+
+    # grid image of up to rows*cols images. The canvas is only used under the lock,
+    # so pages and boosters can be composed from several threads
+    def compose(self, images:list)->Image.Image:
+        if len(images) > self.rows*self.cols: raise ValueError(str(len(images))+' images do not fit a '+str(self.rows)+'x'+str(self.cols)+' grid')
+        cell_size = self.get_cell_size()
+        with self.lock:
+            if self.canvas is None: self.canvas = Image.new('RGB', self.canvas_size, self.background)
+            else: self.canvas.paste(self.background, (0, 0)+self.canvas_size)
+            for i, img in enumerate(images):
+                if img.size != cell_size: img = img.resize(cell_size)
+                # RGBA (foil, stickers) is pasted without its alpha, like convert("RGB")
+                self.canvas.paste(img if img.mode in ('RGB', 'RGBA', 'L') else img.convert('RGB'), self.get_position(i))
+            if self.output_size is not None and self.output_size != self.canvas_size: return self.canvas.resize(self.output_size)
+            return self.canvas.copy()
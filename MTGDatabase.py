@@ -0,0 +1,215 @@
+######################################################################################################
+# Imports
+from dataclasses import dataclass
+import hashlib
+import json
+import os
+from queue import Queue
+import threading
+import time
+import zipfile
+import requests
+from MTGEvents import STATUS, PROGRESS
+
+# Local copy of MTGJSON's AllSetFiles.zip. The archive is downloaded in chunks
+# straight to disk, verified against the published sha256 and never unpacked:
+# set files are read from the zip when a set is first used.
+# Refreshes are conditional (Meta.json version, ETag / If-Modified-Since), so
+# checking an unchanged database costs one or two small requests
+@dataclass
+class MTGDatabase:
+
+    cache_dir_meta:str
+    url:str
+    queue_:Queue
+
+    # only one refresh at a time per process
+    refresh_lock = threading.Lock()
+
+    def __init__(self, cache_dir_meta:str='./cache/metadata/', url:str='https://mtgjson.com/api/v5/AllSetFiles.zip', queue_:Queue=None, chunk_size:int=1024*1024, meta_url:str=None):
+        self.cache_dir_meta = cache_dir_meta
+        self.url = url
+        self.meta_url = meta_url if meta_url is not None else self.url.rsplit('/',1)[0]+'/Meta.json'
+        self.queue_ = queue_
+        self.chunk_size = chunk_size
+        self.file_extension = '.json'
+        self.zip_file = self.cache_dir_meta+os.path.basename(self.url)
+        self.state_file = self.zip_file+'.state.json'
+        # how often to check for a new database (the check is cheap when nothing changed)
+        self.max_age = 24 * 60 * 60
+        self.zip_members = None
+        self.zip_members_mtime = None
+
+    def __put_message__(self, msg:str):
+        if self.queue_ is not None: self.queue_.put((STATUS,msg))
+
+    ###############################################################################
+    # Refresh state (ETag, Last-Modified, MTGJSON version, last check)
+    def __load_state__(self)->dict:
+        if not os.path.isfile(self.state_file): return {}
+        try:
+            with open(self.state_file, 'r') as f: return json.load(f)
+        except:
+            return {}
+
+    def __save_state__(self, state:dict):
+        with open(self.state_file+'.tmp', 'w') as fp: json.dump(state, fp, indent = 4)
+        os.replace(self.state_file+'.tmp', self.state_file)
+
+    def has_database(self)->bool:
+        return os.path.isfile(self.zip_file)
+
+    def is_outdated(self)->bool:
+        if not os.path.isfile(self.zip_file): return True
+        checked_at = self.__load_state__().get('checked_at', os.path.getmtime(self.zip_file))
+        return time.time() - checked_at > self.max_age
+
+    # MTGJSON publishes '<file>.sha256' next to every download
+    def get_published_sha256(self)->str:
+        try:
+            req = requests.get(self.url+'.sha256', timeout=30)
+            req.raise_for_status()
+            return req.text.split()[0].strip().lower()
+        except Exception as e:
+            print(f'Could not fetch published checksum: {e}')
+            return None
+
+    # MTGJSON build version from Meta.json, None if it could not be read
+    def get_published_version(self)->str:
+        try:
+            req = requests.get(self.meta_url, timeout=30)
+            req.raise_for_status()
+            meta = req.json().get('data', {})
+            return str(meta.get('version', ''))+'|'+str(meta.get('date', ''))
+        except Exception as e:
+            print(f'Could not fetch database version: {e}')
+            return None
+
+    # returns the response headers, or None when the server answered 304 Not Modified
+    def download(self, headers:dict=None):
+        if not os.path.isdir(self.cache_dir_meta): os.makedirs(self.cache_dir_meta)
+        part_file = self.zip_file+'.part'
+        sha256 = hashlib.sha256()
+        with requests.get(self.url, stream=True, timeout=60, headers=headers) as req:
+            if req.status_code == 304: return None
+            req.raise_for_status()
+            expected_sha256 = self.get_published_sha256()
+            total = int(req.headers.get('Content-Length', 0))
+            downloaded = 0
+            last_percent = -1
+            with open(part_file, 'wb') as output_file:
+                for chunk in req.iter_content(chunk_size=self.chunk_size):
+                    output_file.write(chunk)
+                    sha256.update(chunk)
+                    downloaded += len(chunk)
+                    percent = int(downloaded*100/total) if total else -1
+                    if percent != last_percent or not total:
+                        last_percent = percent
+                        msg = 'Downloading database... '+'{:.1f}'.format(downloaded/1024/1024)+' MB'
+                        if total: msg += ' / '+'{:.1f}'.format(total/1024/1024)+' MB ('+str(percent)+'%)'
+                        self.__put_message__(msg)
+                        if total and self.queue_ is not None: self.queue_.put((PROGRESS,('download', downloaded, total)))
+            response_headers = dict(req.headers)
+        if expected_sha256 is not None and sha256.hexdigest() != expected_sha256:
+            os.remove(part_file)
+            raise IOError('Checksum mismatch downloading '+self.url)
+        os.replace(part_file, self.zip_file)
+        self.__put_message__('Database downloaded ('+'{:.1f}'.format(downloaded/1024/1024)+' MB)')
+        return response_headers
+
+    # downloads the database only if it changed, returns the set codes whose
+    # content changed (every set on the first download)
+    def refresh(self, force:bool=False)->list[str]:
+        with self.refresh_lock:
+            state = self.__load_state__()
+            has_zip = os.path.isfile(self.zip_file)
+            version = self.get_published_version()
+            if not force and has_zip and version is not None and version == state.get('version'):
+                self.__put_message__('Database is up to date')
+                state['checked_at'] = time.time()
+                self.__save_state__(state)
+                return []
+            headers = {}
+            if not force and has_zip:
+                if 'etag' in state: headers['If-None-Match'] = state['etag']
+                if 'last_modified' in state: headers['If-Modified-Since'] = state['last_modified']
+            old_hashes = self.get_set_hashes() if has_zip else {}
+            response_headers = self.download(headers)
+            if response_headers is None:
+                self.__put_message__('Database is up to date')
+                changed_sets = []
+            else:
+                for key, header in [('etag','ETag'), ('last_modified','Last-Modified')]:
+                    if header in response_headers: state[key] = response_headers[header]
+                    else: state.pop(key, None)
+                new_hashes = self.get_set_hashes()
+                changed_sets = [set_code for set_code, h in new_hashes.items() if old_hashes.get(set_code) != h]
+                self.__put_message__('Database updated, '+str(len(changed_sets))+' sets changed')
+            if version is not None: state['version'] = version
+            state['checked_at'] = time.time()
+            self.__save_state__(state)
+            return changed_sets
+
+    # runs refresh() on a daemon thread, callback gets the changed set codes
+    def refresh_in_background(self, callback=None, force:bool=False)->threading.Thread:
+        def run():
+            try:
+                changed_sets = self.refresh(force)
+            except Exception as e:
+                print(f'Could not refresh database: {e}')
+                self.__put_message__('Could not refresh database: '+str(e))
+                return
+            if callback is not None: callback(changed_sets)
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
+
+    ###############################################################################
+    # Set files
+    def __get_loose_file__(self, set_code:str):
+        return self.cache_dir_meta+set_code+self.file_extension
+
+    # a set json unpacked by previous versions is only used while it is newer than the zip
+    def __use_loose_file__(self, set_code:str)->bool:
+        loose_file = self.__get_loose_file__(set_code)
+        if not os.path.isfile(loose_file): return False
+        return not os.path.isfile(self.zip_file) or os.path.getmtime(loose_file) >= os.path.getmtime(self.zip_file)
+
+    # {file name: (crc32, size)} of the zip, read again only when the zip changes
+    def __get_zip_members__(self)->dict:
+        if not os.path.isfile(self.zip_file): return {}
+        mtime = os.path.getmtime(self.zip_file)
+        if self.zip_members is None or self.zip_members_mtime != mtime:
+            with zipfile.ZipFile(self.zip_file, 'r') as zip_ref:
+                self.zip_members = {info.filename:(info.CRC, info.file_size) for info in zip_ref.infolist()}
+            self.zip_members_mtime = mtime
+        return self.zip_members
+
+    def list_sets(self)->list[str]:
+        if os.path.isfile(self.zip_file):
+            return sorted([f[:-len(self.file_extension)] for f in self.__get_zip_members__() if f.endswith(self.file_extension)])
+        return [f[:-len(self.file_extension)] for f in os.listdir(self.cache_dir_meta) if os.path.isfile(os.path.join(self.cache_dir_meta, f)) and f.endswith(self.file_extension)]
+
+    def has_set(self, set_code:str)->bool:
+        if self.__use_loose_file__(set_code): return True
+        return set_code+self.file_extension in self.__get_zip_members__()
+
+    # content hash of a set file (crc32 and size from the zip directory, nothing is decompressed)
+    def get_set_hash(self, set_code:str)->str:
+        if self.__use_loose_file__(set_code):
+            loose_file = self.__get_loose_file__(set_code)
+            return 'file:'+str(os.path.getmtime(loose_file))+':'+str(os.path.getsize(loose_file))
+        member = self.__get_zip_members__().get(set_code+self.file_extension)
+        if member is None: return None
+        return 'zip:'+format(member[0], '08x')+':'+str(member[1])
+
+    def get_set_hashes(self)->dict:
+        return {set_code:self.get_set_hash(set_code) for set_code in self.list_sets()}
+
+    # raw bytes of a set json file, read from the zip without unpacking it
+    def read_set_file(self, set_code:str)->bytes:
+        if self.__use_loose_file__(set_code):
+            with open(self.__get_loose_file__(set_code), 'rb') as f: return f.read()
+        if not self.has_set(set_code): raise FileNotFoundError(set_code+self.file_extension)
+        with zipfile.ZipFile(self.zip_file, 'r') as zip_ref:
+            return zip_ref.read(set_code+self.file_extension)
@@ -0,0 +1,70 @@
+######################################################################################################
+# Imports
+from dataclasses import dataclass
+import queue
+import threading
+import weakref
+
+# Messages put on a window's queue are (code, payload) tuples:
+#   (0, text)                     status text
+#   (1, text)                     info/error text, the job is done
+#   (2, result)                   job result (booster, collection book...)
+#   (3, result)                   window specific (i.e. database loaded)
+#   (4, (phase, current, total))  progress of a phase ('images', 'prices', 'pages'...)
+STATUS = 0
+INFO = 1
+RESULT = 2
+READY = 3
+PROGRESS = 4
+
+# Hands out one queue (channel) per window or job, so windows open at the same
+# time do not take each other's messages. Channels are dropped with their window
+@dataclass
+class MTGEventBus:
+
+    def __init__(self):
+        self.channels = weakref.WeakValueDictionary() # name -> queue
+        self.counter = 0
+        self.lock = threading.Lock()
+
+    # new channel, named name-1, name-2... when the same name is opened again
+    def open_channel(self, name:str)->queue.Queue:
+        with self.lock:
+            self.counter += 1
+            channel = queue.Queue()
+            channel.name = name+'-'+str(self.counter)
+            self.channels[channel.name] = channel
+            return channel
+
+    # message to every open window (i.e. the card database was refreshed)
+    def broadcast(self, msg:tuple):
+        with self.lock:
+            channels = list(self.channels.values())
+        for channel in channels: channel.put(msg)
+
+# every message pending on a queue (at most max_messages), without blocking
+def drain(queue_:queue.Queue, max_messages:int=1000)->list:
+    messages = []
+    while len(messages) < max_messages:
+        try:
+            messages.append(queue_.get_nowait())
+        except queue.Empty:
+            break
+    return messages
+
+# messages to handle one by one (results, done) and what to show once per tick:
+# the last status text and the last progress of each phase
+def coalesce(messages:list)->tuple:
+    events = []
+    status = None
+    progress = {}
+    for msg in messages:
+        if msg[0]==PROGRESS: progress[msg[1][0]] = msg[1]
+        else:
+            if msg[0] in [STATUS, INFO]: status = msg[1]
+            if msg[0]!=STATUS: events.append(msg)
+    return events, status, list(progress.values())
+
+######################################################################################################
+# Shared bus
+event_bus = MTGEventBus()
@@ -0,0 +1,40 @@
+######################################################################################################
+# Imports
+from dataclasses import dataclass
+from PIL import Image
+from MTGLRUCache import MTGLRUCache
+
+# Process-wide LRU cache of decoded card images, keyed by (scryfallId, variant, size).
+# variant is 'base' for the image as downloaded, or the overlays applied to it
+# ('foil', 'new', 'foil+new'); size is None for the full size image. Entries are
+# evicted (least recently used first) once the decoded size of all cached images
+# goes over max_bytes. Cached images are shared, callers must not draw on them
+@dataclass
+class MTGImageCache(MTGLRUCache):
+
+    def __init__(self, max_bytes:int=512*1024*1024):
+        super().__init__(max_bytes)
+
+    def put(self, key:tuple, img:Image.Image, version=None)->Image.Image:
+        # Image.open only reads the header, decode now so the cache holds pixels
+        img.load()
+        return super().put(key, img, version)
+
+    # drops every variant of a card (or everything)
+    def invalidate(self, scryfallId:str=None):
+        if scryfallId is None: return super().invalidate()
+        with self.lock:
+            for key in [k for k in self.entries if k[0]==scryfallId]: self.__remove__(key)
+
+    # 'Image cache: 120/150 hits (80%), 45.3 MB'
+    def summary(self)->str:
+        s = self.stats()
+        return 'Image cache: '+str(s['hits'])+'/'+str(s['hits']+s['misses'])+' hits ('+'{:.0f}'.format(s['hit_rate']*100)+'%), '+'{:.1f}'.format(s['bytes']/(1024*1024))+' MB'
+
+    # decoded size in bytes
+    def __estimate_size__(self, img:Image.Image)->int:
+        return img.size[0]*img.size[1]*len(img.getbands())
+
+######################################################################################################
+# Shared cache (used by every window in the process)
+image_cache = MTGImageCache()
@@ -0,0 +1,71 @@
+######################################################################################################
+# Imports
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from queue import Queue
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from MTGCard import MTGCard
+from MTGEvents import STATUS, PROGRESS
+
+# Fetches card images on a bounded thread pool. All downloads go through one
+# shared requests.Session, so connections are kept alive between cards
+@dataclass
+class MTGImageFetcher:
+
+    concurrency:int
+    queue_:Queue
+
+    def __init__(self, concurrency:int=8, queue_:Queue=None, session:requests.Session=None):
+        self.concurrency = concurrency
+        self.queue_ = queue_
+        self.session = session if session is not None else get_session(concurrency)
+        self.lock = threading.Lock()
+
+    # completed is the [count] of the fetch() call the card belongs to, fetches
+    # running at the same time (i.e. prefetched pages) report their own progress
+    def __fetch_card__(self, card:MTGCard, total:int, completed:list, size:tuple=None):
+        img = card.__get_image__(self.session) if size is None else card.get_thumbnail(size, self.session)
+        with self.lock:
+            completed[0] += 1
+            completed = completed[0]
+            msg = 'Image '+str(completed)+'/'+str(total)+' ready: '+card.name
+        if self.queue_ is not None:
+            self.queue_.put((STATUS,msg))
+            self.queue_.put((PROGRESS,('images', completed, total)))
+        return img
+
+    # returns the images in the same order as the cards (decoded at size if given)
+    def fetch(self, cards:list[MTGCard], size:tuple=None)->list:
+        completed = [0]
+        # the first card of each scryfallId downloads the image, repeated cards
+        # (i.e. same card twice in a booster) run afterwards and read it from cache
+        first, repeated = [], []
+        seen = set()
+        for i, card in enumerate(cards):
+            if card.scryfallId in seen: repeated.append(i)
+            else:
+                seen.add(card.scryfallId)
+                first.append(i)
+        images = [None]*len(cards)
+        with ThreadPoolExecutor(max_workers=max(1, self.concurrency)) as executor:
+            for indexes in [first, repeated]:
+                futures = {i:executor.submit(self.__fetch_card__, cards[i], len(cards), completed, size) for i in indexes}
+                for i, future in futures.items(): images[i] = future.result()
+        return images
+
+######################################################################################################
+# Shared HTTP session
+session = None
+session_lock = threading.Lock()
+
+def get_session(pool_size:int=8)->requests.Session:
+    global session
+    with session_lock:
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(pool_size, 8))
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+        return session
@@ -13,17 +13,27 @@
 ######################################################################################################
 # Imports
 from dataclasses import dataclass
-import numpy as np
+import math
 import os
 import json
 import queue
-import requests
-import zipfile
 from datetime import datetime
 from MTGCard import MTGCard
-import random
-from PIL import Image
+from MTGSetIndex import MTGSetIndex, get_set_index
+from MTGCardStore import MTGCardStore
+from MTGSetCache import MTGSetCache, set_cache
+from MTGBoosterHistory import MTGBoosterHistory
+from MTGPriceStore import price_store
+from MTGPriceResolver import MTGPriceResolver
+from MTGImageFetcher import MTGImageFetcher
+from MTGImageCache import image_cache
+from MTGDatabase import MTGDatabase
+from MTGBoosterSampler import MTGBoosterSampler, MTGBoosterBatch
+from MTGCompositor import MTGCompositor
 import time
+from PIL import Image
+from MTGMetrics import metrics
+from MTGEvents import STATUS, INFO, event_bus
 
 
 @dataclass
@@ -35,169 +45,181 @@ class MTGJson:
     sets:list[str]
     queue_:queue
 
-    def __init__(self, queue_:queue=None, ):
+    def __init__(self, queue_:queue=None, set_cache_:MTGSetCache=None, background_refresh:bool=True):
         self.cache_dir_meta = './cache/metadata/'
         url_base_pre = 'https://mtgjson.com/api/v5/'
         json_file = 'AllSetFiles.zip'
         self.file_extension = '.json'
         self.generated_boosters_json = 'boosters.json'
+        self.generated_boosters_db = 'boosters.db'
         self.datetime_format = '%Y-%m-%d %H:%M:%S'
         self.url_composed = url_base_pre+json_file
         self.queue_ = queue_
         self.set_json_data = None
+        self.database = MTGDatabase(self.cache_dir_meta, self.url_composed, self.queue_)
+        self.card_store = MTGCardStore(self.cache_dir_meta, queue_=self.queue_, database=self.database)
+        # parsed set data is shared between instances unless a dedicated cache is given
+        self.set_cache = set_cache_ if set_cache_ is not None else set_cache
+        self.price_resolver = MTGPriceResolver(queue_=self.queue_)
+        self.image_fetcher = MTGImageFetcher(queue_=self.queue_)
+        self.compositors = {} # columns -> MTGCompositor (canvas reused between boosters)
+        self.samplers = {} # set code -> MTGBoosterSampler (booster plans built once per set)
+        self.booster_summary = '' # phases of the last generated booster
         if not os.path.isdir(self.cache_dir_meta):os.makedirs(self.cache_dir_meta)
-        if not os.path.isfile(self.cache_dir_meta+json_file) or (os.path.isfile(self.cache_dir_meta+json_file) and time.time() - os.path.getmtime(self.cache_dir_meta+json_file) > (30 * 24 * 60 * 60)):
-            if self.queue_ is not None:self.queue_.put((0,'Database not found in cache. Downloading...'))
-            # Download
-            req = requests.get(self.url_composed)
-            # save
-            with open(self.cache_dir_meta+json_file,'wb') as output_file:
-                output_file.write(req.content)
-            # Unpack
-            if self.queue_ is not None: self.queue_.put((0,'Unpacking database...'))
-            with zipfile.ZipFile(self.cache_dir_meta+json_file, 'r') as zip_ref:
-                zip_ref.extractall(self.cache_dir_meta)
-        self.sets = [f[:-len(self.file_extension)] for f in os.listdir(self.cache_dir_meta) if os.path.isfile(os.path.join(self.cache_dir_meta, f)) and f.endswith(self.file_extension)]
+        # imports boosters.json from previous versions on first run
+        self.history = MTGBoosterHistory(self.cache_dir_meta+self.generated_boosters_db, self.cache_dir_meta+self.generated_boosters_json)
+        # First run downloads the database, later refreshes run in the background and
+        # only download it again when MTGJSON published a new version
+        if not self.database.has_database():
+            if self.queue_ is not None:self.queue_.put((STATUS,'Database not found in cache. Downloading...'))
+            self.database.refresh()
+        elif background_refresh and self.database.is_outdated():
+            self.database.refresh_in_background(self.__database_refreshed__)
+        self.sets = self.database.list_sets()
+
+    # compiled sets whose content changed are rebuilt on their next use, drop what is in memory
+    def __database_refreshed__(self, changed_sets:list[str]):
+        self.sets = self.database.list_sets()
+        for set_code in changed_sets:
+            self.set_cache.invalidate(set_code)
+        # every open window shows it, not only the one that started the refresh
+        if len(changed_sets) > 0: event_bus.broadcast((STATUS, 'Card database updated ('+str(len(changed_sets))+' sets changed)'))
+
+    # index over the compiled set (compiled on first access if needed). Kept in the
+    # set cache until the store changes or it gets evicted
+    def get_set_index(self, set_name:str)->MTGSetIndex:
+        return get_set_index(self.card_store, set_name, self.set_cache)
+
+    # set json rebuilt from the compiled store, for compatibility and debugging
+    def get_set_json(self, set_name:str)->json:
+        return self.card_store.load_set_json(set_name)
 
     def get_booster_distribution_values(self, set_name:str)->list[str]:
         try:
-            with open(self.cache_dir_meta+set_name+self.file_extension, encoding='UTF-8') as f: set_json_data = json.load(f)
-            booster_distributions = []
-            booster_distributions = set_json_data['data']['booster']
-            return booster_distributions
+            return self.card_store.open_set(set_name).get_booster_distribution_values()
         except:
             return None
 
 
     def generate_booster(self, set_name:str, booster_distribution:str=None):
-        if self.queue_ is not None:  self.queue_.put((0,'Generating a new booster from set ['+set_name+']'))
+        if self.queue_ is not None:  self.queue_.put((STATUS,'Generating a new booster from set ['+set_name+']'))
         if set_name not in self.sets:
             #print(f'Set [{set_name}] could not be found.')
             return None
-        # read set json file
-        with open(self.cache_dir_meta+set_name+self.file_extension, encoding='UTF-8') as f: set_json_data = json.load(f)
-        ###############################################################################
-        # read booster json file
-        if os.path.isfile(self.cache_dir_meta+self.generated_boosters_json):
-            with open(self.cache_dir_meta+self.generated_boosters_json, 'r') as file:
-                booster_json = json.loads(file.read())
-            collected_uuids = []
-            for e in [v for v in list(booster_json.values())]:
-                if e['setCode']==set_name:
-                    for f in e['cards']:
-                        collected_uuids.append(f['uuid'])
+        start = time.perf_counter()
+        counters = metrics.snapshot()
+        # read set data
+        with metrics.span('booster.set_load'):
+            set_index = self.get_set_index(set_name)
+        if booster_distribution is None: booster_distribution = set_index.get_booster_distribution_values()[0]
         ###############################################################################
         # get cards
-        cards_in_booster = self.__get_booster__(set_json_data, booster_distribution)
+        with metrics.span('booster.sampling'):
+            cards_in_booster = self.__get_booster__(set_index, booster_distribution)
+        # check against booster history
+        with metrics.span('booster.history'):
+            collected_uuids = self.history.get_collected_uuids(set_name, [card.uuid for card in cards_in_booster])
         for card in cards_in_booster:
             if card.uuid not in collected_uuids:
                 card.newly_collected = True
         # Fetch images
-        self.__fetch_images__(cards_in_booster)
+        with metrics.span('booster.images'):
+            self.__fetch_images__(cards_in_booster)
         # Fetch all prices
-        self.__fetch_prices__(cards_in_booster)
+        with metrics.span('booster.prices'):
+            self.__fetch_prices__(cards_in_booster)
         # Save it
-        self.__save_booster_to_json__(cards_in_booster, set_json_data)
+        with metrics.span('booster.save'):
+            self.__save_booster__(cards_in_booster, set_index.meta)
+        metrics.record('booster.total', time.perf_counter()-start)
+        self.booster_summary = self.get_booster_summary(counters)
         # Notify GUI
         msg = '['+set_name+'] booster generated successfully'
-        if self.queue_ is not None: self.queue_.put((1,msg))
+        if self.queue_ is not None: self.queue_.put((INFO,msg))
         print(msg)
         print(f'{cards_in_booster}')
+        print('Timings: '+self.booster_summary)
+        print(image_cache.summary())
         return cards_in_booster
+
+    # phases of the last generated booster and where its images and prices came from
+    # (memory/disk/network), counted since the counters snapshot
+    def get_booster_summary(self, counters:dict=None)->str:
+        parts = [metrics.summary('booster.', since=counters), metrics.summary('images.', since=counters), metrics.summary('prices.', since=counters)]
+        return ' | '.join(part for part in parts if part)
     
-    def __get_card_by_name__(self, card_name:str, json_data:json):
-        '''
-        #Non pythonic way
-        cards = json_data['data']['cards']
-        for card in cards:
-            if card['name']==card_name: return card
-        return []
-        '''
-        # Pythonic way
-        return list(filter(lambda card: card['name'] == card_name, json_data['data']['cards']))
+    # Generates many boosters at once for analysis. Returns a MTGBoosterBatch (card store
+    # rows per booster); images, prices and history are skipped unless requested
+    def generate_boosters(self, set_code:str, booster_distribution:str, n:int, *, with_images:bool=False, with_prices:bool=False, persist:bool=False, seed=None)->MTGBoosterBatch:
+        if set_code not in self.sets: return None
+        stored_set = self.card_store.open_set(set_code)
+        if stored_set is None: return None
+        if booster_distribution is None: booster_distribution = stored_set.get_booster_distribution_values()[0]
+        batch = MTGBoosterSampler(stored_set).sample(booster_distribution, n, seed)
+        # one card per printing is enough to fetch images and prices
+        if with_images:
+            self.__fetch_images__([MTGCard(stored_set.get_card_json(row), self.queue_) for row in batch.get_unique_rows()])
+        if with_prices:
+            scryfallIds = [card['scryfallId'].decode() for card in stored_set.cards]
+            try:
+                self.price_resolver.fetch_missing([scryfallIds[row] for row in batch.get_unique_rows()])
+            finally:
+                price_store.flush()
+            usd, usd_foil = price_store.get_price_arrays(scryfallIds)
+            batch.values = batch.get_values(usd, usd_foil)
+        if persist:
+            self.__save_boosters__(batch)
+        return batch
 
-    def __get_booster__(self, set_json_data:json, booster_distribution):
-        # Get propper booster distribution with weights from json [data][booster] info
-        boosters = set_json_data['data']['booster'][booster_distribution]['boosters']
-        booster_contents = random.choices(boosters, weights = [w['weight'] for w in boosters], k=1)[0]['contents']
-        # Sets up correct rarity order
-        key_order = ['basic', 'common', 'commonWithShowcase', 'uncommon', 'uncommonWithShowcase', 'rare', 'rareMythicWithShowcase', 'rareMythic', 'foil', 'foilWithShowcase']
-        sorted_booster_contents = {}
-        for key in key_order:
-            if key in booster_contents:
-                sorted_booster_contents[key] = booster_contents[key]
-        sheets = set_json_data['data']['booster'][booster_distribution]['sheets']
-        cards_in_booster = []
-        # Distribution for older sets
-        if 'basic' not in list(sorted_booster_contents.keys()):
-            for k, v in sorted_booster_contents.items():
-                if k=='common':
-                    # if there are lands in set
-                    lands = list(filter(lambda card: ('Basic Land' in card['type']), set_json_data['data']['cards']))
-                    if len(lands)>0:
-                        #1 land
-                        land = random.sample(lands, k=1)[0]
-                        card = MTGCard(list(filter(lambda card: (land['uuid'] == card['uuid']), set_json_data['data']['cards']))[0], self.queue_)
-                        cards_in_booster.append(card)
-                        #rest common and not land
-                        commons_not_lands = list(filter(lambda card: ((card['rarity']==k) and ('Basic Land' not in card['type'])), set_json_data['data']['cards']))
-                        commons = random.sample(commons_not_lands, k=v-1)
-                    else:
-                        commons_not_lands = list(filter(lambda card: ((card['rarity']==k) and ('Basic Land' not in card['type'])), set_json_data['data']['cards']))
-                        commons = random.sample(commons_not_lands, k=v)
-                    for e in commons:
-                        card = MTGCard(list(filter(lambda card: (e['uuid'] == card['uuid']), set_json_data['data']['cards']))[0], self.queue_)
-                        cards_in_booster.append(card)
-                if k=='uncommon':
-                    uncommons_not_lands = list(filter(lambda card: ((card['rarity']==k) and ('Basic Land' not in card['type'])), set_json_data['data']['cards']))
-                    uncommons = random.sample(uncommons_not_lands, k=v)
-                    for e in uncommons:
-                        card = MTGCard(list(filter(lambda card: (e['uuid'] == card['uuid']), set_json_data['data']['cards']))[0], self.queue_)
-                        cards_in_booster.append(card)
-                if k=='rare':
-                    rares_not_lands = list(filter(lambda card: ((card['rarity']==k) and ('Basic Land' not in card['type'])), set_json_data['data']['cards']))
-                    rares = random.sample(rares_not_lands, k=v)
-                    for e in rares:
-                        card = MTGCard(list(filter(lambda card: (e['uuid'] == card['uuid']), set_json_data['data']['cards']))[0], self.queue_)
-                        cards_in_booster.append(card)
-        # Distribution for newer sets
-        else:
-            for k, v in sorted_booster_contents.items():
-                uuid_list = random.sample(list(sheets[k]['cards'].keys()), counts=[w for w in list(sheets[k]['cards'].values())], k=v)
-                for uuid in uuid_list:
-                    if k=='foil': is_foil = True
-                    else: is_foil = False
-                    card = MTGCard(list(filter(lambda card: (uuid == card['uuid']), set_json_data['data']['cards']))[0], self.queue_, foil=is_foil)
-                    cards_in_booster.append(card)
-        #print(booster_card_uuids)
-        return cards_in_booster
+    def __get_card_by_name__(self, card_name:str, set_index:MTGSetIndex):
+        return set_index.get_cards_by_name(card_name)
+
+    # one booster drawn by the set's sampler (weighted booster layout, sheet weights,
+    # older sets without sheets), reading the compiled tables directly
+    def __get_booster__(self, set_index:MTGSetIndex, booster_distribution:str):
+        sampler = self.samplers.get(set_index.set_code)
+        if sampler is None or sampler.stored_set is not set_index.stored_set:
+            sampler = MTGBoosterSampler(set_index.stored_set)
+            self.samplers[set_index.set_code] = sampler
+        return sampler.sample(booster_distribution, 1).get_booster(0, self.queue_)
 
     def __get_generated_booster_images__(self):
         return [self.cache_dir_meta+f for f in os.listdir(self.cache_dir_meta) if f.startswith('booster') and f.endswith(self.file_extension)]
 
-    def __save_booster_to_json__(self, booster:list[MTGCard], set_json_data:json):
-        data = {}
-        # If file does not exist, create it
-        if not os.path.isfile(self.cache_dir_meta+self.generated_boosters_json):
-            with open(self.cache_dir_meta+self.generated_boosters_json, 'w') as fp:
-                json.dump(data, fp, indent = 4)
-        # Else, load it
-        else:
-            with open(self.cache_dir_meta+self.generated_boosters_json, 'r') as file:
-                data = json.loads(file.read())
-        # Put newly generated booster to file
+    def __save_booster__(self, booster:list[MTGCard], meta:dict):
+        # Append newly generated booster to history
+        now = datetime.now().strftime(self.datetime_format)
+        self.history.add_booster(now, self.__get_booster_json__(booster, meta))
+
+    def __save_boosters__(self, batch:MTGBoosterBatch):
+        meta = batch.stored_set.meta
         now = datetime.now().strftime(self.datetime_format)
-        data[now] = self.__get_booster_json__(booster, set_json_data)
-        # Save
-        with open(self.cache_dir_meta+self.generated_boosters_json, 'w') as fp:
-            json.dump(data, fp, indent = 4)
+        boosters = []
+        for i in range(len(batch)):
+            booster_json = {'set':meta['name'], 'setCode':meta['code'], 'releaseDate':meta['releaseDate'], 'type':meta['type'], 'cards':[]}
+            for row, foil in batch.get_booster_rows(i):
+                card_json = batch.stored_set.get_card_json(row)
+                price = 0.0
+                if batch.values is not None:
+                    prices = price_store.get(card_json['identifiers']['scryfallId'], include_expired=True)
+                    p = None if prices is None else prices['usd_foil' if foil else 'usd']
+                    if p is not None: price = float(p)
+                booster_json['cards'].append({'name':card_json['name'], 'uuid':card_json['uuid'], 'scryfallId':card_json['identifiers']['scryfallId'],
+                                              'rarity':card_json['rarity'], 'foil':foil, 'price':price})
+            booster_json['boosterTotalValue'] = float(batch.values[i]) if batch.values is not None else 0.0
+            boosters.append((now, booster_json))
+        self.history.add_boosters(boosters)
 
-    def __get_booster_json__(self, booster:list[MTGCard], set_json_data:json):
+    # writes the booster history in the boosters.json format used by previous versions
+    def export_boosters_json(self, json_file:str=None):
+        return self.history.export_json(json_file)
+
+    def __get_booster_json__(self, booster:list[MTGCard], meta:dict):
         booster_json = {}
-        booster_json['set'] = set_json_data['data']['name']
-        booster_json['setCode'] = set_json_data['data']['code']
-        booster_json['releaseDate'] = set_json_data['data']['releaseDate']
-        booster_json['type'] = set_json_data['data']['type']
+        booster_json['set'] = meta['name']
+        booster_json['setCode'] = meta['code']
+        booster_json['releaseDate'] = meta['releaseDate']
+        booster_json['type'] = meta['type']
         booster_json['cards'] = []
         accum = 0.0
         for card in booster:
@@ -223,8 +245,8 @@ class MTGJson:
             self.__delete_oldest_image__()
 
     def display(self, booster_cards:list[MTGCard]):
-        if self.queue_ is not None: self.queue_.put((0,'Displaying booster...'))
-        if(len(booster_cards)!=15): return False
+        if self.queue_ is not None: self.queue_.put((STATUS,'Displaying booster...'))
+        if(len(booster_cards)==0): return False
         img = self.__assemble__(self.__fetch_images__(booster_cards))
         str_date_time = datetime.now().strftime("%y-%m-%d-%H-%M-%S")
         filename = booster_cards[0].cache_dir_img+'booster-'+str_date_time+'.png'
@@ -232,48 +254,20 @@ class MTGJson:
         img.show() #PIL
         self.__control_cache__() # keeps only a few last generated booster packs not to consume too much space
 
-    def __overlay_image__(self, l_img, s_img, x_offset, y_offset):
-        height = s_img.height #PIL
-        width = s_img.width #PIL
-        l_img[y_offset:y_offset+height, x_offset:x_offset+width] = s_img
-        return l_img
-
+    # cards in 3 rows, as many columns as needed
     def __assemble__(self, card_image_list_as_image:list):
-        x_spacing = 50
-        y_spacing = 50
-        rows = [0,1,2]
-        cols = [0,1,2,3,4]
-        x_max = 0
-        y_max = 0
-        for card_image in card_image_list_as_image:
-            height = card_image.height #PIL
-            width = card_image.width #PIL
-            if x_max < height: x_max = height
-            if y_max < width: y_max = width
-        x_full_length = (x_max*len(rows))+(len(rows)*x_spacing)+x_spacing
-        y_full_length = (y_max*len(cols))+(len(cols)*y_spacing)+y_spacing
-        img = np.zeros([x_full_length,y_full_length,3],dtype=np.uint8)
-        #img.fill(255) #make image white
-        i=0
-        for col in cols:
-            for row in rows:
-                card_image = card_image_list_as_image[i]
-                height = card_image.height #PIL
-                width = card_image.width #PIL
-                x = x_spacing+(x_spacing*row)+(row*height)
-                y = y_spacing+(y_spacing*col)+(col*width)
-                img = self.__overlay_image__(img,card_image_list_as_image[i],y,x)
-                i+=1
-        img = Image.fromarray(img) #PIL
-        return img
+        rows = 3
+        cols = math.ceil(len(card_image_list_as_image)/rows)
+        if cols not in self.compositors: self.compositors[cols] = MTGCompositor(rows, cols)
+        return self.compositors[cols].compose(card_image_list_as_image)
     
     def __fetch_images__(self, booster_cards:list[MTGCard]):
-        card_image_list_as_image = []
-        for card in booster_cards:
-            card_image_list_as_image.append(card.__get_image__())
-        return card_image_list_as_image
+        return self.image_fetcher.fetch(booster_cards)
 
     def __fetch_prices__(self, booster_cards:list[MTGCard]):
-        for card in booster_cards:
-            card.__get_price__()
+        try:
+            self.price_resolver.resolve(booster_cards)
+        finally:
+            # one write for the whole booster
+            price_store.flush()
     
@@ -0,0 +1,82 @@
+######################################################################################################
+# Imports
+from collections import OrderedDict
+from dataclasses import dataclass
+import threading
+
+# In-process LRU cache with a byte budget. Entries are evicted (least recently used
+# first) once the estimated size of all entries goes over max_bytes; the newest entry
+# is always kept, even if it alone is over budget. An entry can carry a version
+# (i.e. a file mtime), a lookup with another version is a miss.
+# Subclasses tell the size of a value with __estimate_size__
+@dataclass
+class MTGLRUCache:
+
+    max_bytes:int
+    hits:int
+    misses:int
+    evictions:int
+
+    def __init__(self, max_bytes:int):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.current_bytes = 0
+        self.entries = OrderedDict() # key -> (value, size, version)
+        self.lock = threading.Lock()
+
+    # cached value, or loader() (which returns a value or None) cached
+    def get(self, key, loader=None, version=None):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[2]==version:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                return entry[0]
+            self.misses += 1
+        if loader is None: return None
+        value = loader()
+        if value is None: return None
+        return self.put(key, value, version)
+
+    # cached value without counting a hit or miss
+    def peek(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            return None if entry is None else entry[0]
+
+    def put(self, key, value, version=None):
+        size = self.__estimate_size__(value)
+        with self.lock:
+            self.__remove__(key)
+            self.entries[key] = (value, size, version)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes and len(self.entries) > 1:
+                oldest = next(iter(self.entries))
+                self.__remove__(oldest)
+                self.evictions += 1
+        return value
+
+    # drops an entry (or everything)
+    def invalidate(self, key=None):
+        with self.lock:
+            if key is None:
+                self.entries.clear()
+                self.current_bytes = 0
+            else:
+                self.__remove__(key)
+
+    def __remove__(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None: self.current_bytes -= entry[1]
+
+    def stats(self)->dict:
+        with self.lock:
+            lookups = self.hits+self.misses
+            return {'hits':self.hits, 'misses':self.misses, 'hit_rate':self.hits/lookups if lookups else 0.0,
+                    'evictions':self.evictions, 'entries':len(self.entries), 'bytes':self.current_bytes, 'max_bytes':self.max_bytes}
+
+    # size of a value in bytes
+    def __estimate_size__(self, value)->int:
+        raise NotImplementedError
@@ -0,0 +1,106 @@
+######################################################################################################
+# Imports
+from contextlib import contextmanager
+from dataclasses import dataclass
+import json
+import os
+import threading
+import time
+
+# In-process metrics registry. Every named phase (span) keeps its call count, total,
+# min, max and last duration in seconds; counters count events (i.e. images read
+# from disk vs downloaded). With an output file (or the MTG_METRICS_FILE environment
+# variable) every span and counter update is also appended as a JSON line
+@dataclass
+class MTGMetrics:
+
+    timings:dict
+    counters:dict
+
+    def __init__(self, output_file:str=None):
+        self.timings = {}
+        self.counters = {}
+        self.lock = threading.Lock()
+        self.output = None
+        self.set_output(output_file if output_file is not None else os.environ.get('MTG_METRICS_FILE'))
+
+    # JSON lines file for every span and counter update (None to stop writing)
+    def set_output(self, output_file:str=None):
+        with self.lock:
+            if self.output is not None: self.output.close()
+            self.output = None
+            if output_file:
+                output_dir = os.path.dirname(output_file)
+                if output_dir and not os.path.isdir(output_dir): os.makedirs(output_dir)
+                self.output = open(output_file, 'a', buffering=1)
+
+    def __write__(self, entry:dict):
+        if self.output is None: return
+        entry['ts'] = time.time()
+        self.output.write(json.dumps(entry)+'\n')
+
+    def record(self, name:str, seconds:float):
+        with self.lock:
+            t = self.timings.get(name)
+            if t is None:
+                self.timings[name] = {'count':1, 'total':seconds, 'min':seconds, 'max':seconds, 'last':seconds}
+            else:
+                t['count'] += 1
+                t['total'] += seconds
+                t['min'] = min(t['min'], seconds)
+                t['max'] = max(t['max'], seconds)
+                t['last'] = seconds
+            self.__write__({'span':name, 'seconds':seconds})
+
+    # with metrics.span('startup.database'): ...
+    @contextmanager
+    def span(self, name:str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter()-start)
+
+    def increment(self, name:str, n:int=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0)+n
+            self.__write__({'counter':name, 'n':n})
+
+    def get_last(self, name:str)->float:
+        with self.lock:
+            t = self.timings.get(name)
+            return None if t is None else t['last']
+
+    def get_counter(self, name:str)->int:
+        with self.lock:
+            return self.counters.get(name, 0)
+
+    # copy of every span and counter
+    def snapshot(self)->dict:
+        with self.lock:
+            return {'timings':{name:dict(t) for name, t in self.timings.items()}, 'counters':dict(self.counters)}
+
+    # 'name 0.12s, name 0.03s, name 4' of every span (last run, or total with field='total')
+    # and counter starting with prefix. With since (a snapshot) only what ran after it is shown:
+    # the time spent in each span since then, with the number of runs when it ran more than once
+    # (i.e. 'download 1.20s x5'), and counters counted from it
+    def summary(self, prefix:str='', field:str='last', since:dict=None)->str:
+        with self.lock:
+            parts = []
+            for name, t in self.timings.items():
+                if not name.startswith(prefix): continue
+                if since is None:
+                    parts.append(name[len(prefix):]+' '+'{:.2f}'.format(t[field])+'s')
+                    continue
+                before = since['timings'].get(name, {'count':0, 'total':0.0})
+                count = t['count']-before['count']
+                if count == 0: continue
+                parts.append(name[len(prefix):]+' '+'{:.2f}'.format(t['total']-before['total'])+'s'+(' x'+str(count) if count > 1 else ''))
+            for name, n in self.counters.items():
+                if since is not None: n -= since['counters'].get(name, 0)
+                if name.startswith(prefix) and n != 0: parts.append(name[len(prefix):]+' '+str(n))
+            return ', '.join(parts)
+
+######################################################################################################
+# Shared metrics
+metrics = MTGMetrics()
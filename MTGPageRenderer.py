@@ -0,0 +1,103 @@
+######################################################################################################
+# Imports
+from dataclasses import dataclass
+import hashlib
+import os
+from queue import Queue
+from PIL import Image
+from MTGCard import MTGCard
+from MTGImageFetcher import MTGImageFetcher
+from MTGImageCache import image_cache
+from MTGCompositor import MTGCompositor
+from MTGMetrics import metrics
+
+# Renders collection pages of a set: the page layout, its compositor and the page
+# cache in cache/collections/<SET>/. Holds no collection state (history, set data),
+# so it is cheap to build in a worker process. The image fetcher is only created
+# when a page needs card images
+@dataclass
+class MTGPageRenderer:
+
+    set_code:str
+    rows:int
+    cols:int
+    card_dimensions:tuple
+    card_spacing:int
+    page_dimensions:tuple
+    thumbnails:bool
+    page_cache:bool
+
+    def __init__(self, set_code:str, thumbnails:bool=True, page_cache:bool=True, queue_:Queue=None, image_fetcher:MTGImageFetcher=None):
+        self.set_code = set_code
+        self.rows, self.cols = 3, 5
+        self.card_dimensions = (488,680)
+        self.card_spacing = 50
+        self.page_dimensions = (1100,900)
+        # decode cards at page cell size instead of full size (then downsizing the page)
+        self.thumbnails = thumbnails
+        if self.thumbnails:
+            scale = MTGCompositor.get_fit_scale(self.rows, self.cols, self.card_dimensions, self.card_spacing, self.page_dimensions)
+            self.compositor = MTGCompositor(self.rows, self.cols, self.card_dimensions, self.card_spacing, scale, self.page_dimensions)
+        else: self.compositor = MTGCompositor(self.rows, self.cols, self.card_dimensions, self.card_spacing, output_size=self.page_dimensions)
+        self.cards_in_page = self.rows*self.cols
+        # rendered pages are kept in cache/collections/<SET>/ until their cards change
+        self.page_cache = page_cache
+        self.file_extension = '.png'
+        self.cache_dir_collections = './cache/collections/'+self.set_code+'/'
+        self.queue_ = queue_
+        self.image_fetcher = image_fetcher
+
+    # page from cache/collections/<SET>/ if its cards did not change, rendered (and saved) otherwise
+    def get_page(self, cards:list, page:int):
+        with metrics.span('page.total'):
+            page_file = self.__get_page_file__(cards, page)
+            if self.page_cache and os.path.isfile(page_file):
+                metrics.increment('page.cached')
+                with metrics.span('page.cache_load'), Image.open(page_file) as f:
+                    return f.convert('RGB')
+            page_img = self.__render_page__(cards)
+            metrics.increment('page.rendered')
+            # not kept if a card image could not be downloaded (card back shown instead)
+            complete = all(os.path.isfile(card.cache_dir_img+card.scryfallId+card.file_extension) for card in cards if card.collected)
+            if self.page_cache and complete:
+                with metrics.span('page.save'):
+                    self.__save_page__(page_img, page_file, page)
+            return page_img
+
+    # page file name carries a hash of the page's card state (uuid, collected, foil) and
+    # the layout, pages that did not change keep their file
+    def __get_page_file__(self, cards:list, page:int)->str:
+        page_state = [str(self.thumbnails), str(self.page_dimensions)]+[card.uuid+':'+str(int(card.collected))+':'+str(int(card.foil)) for card in cards]
+        page_hash = hashlib.sha1('|'.join(page_state).encode()).hexdigest()[:16]
+        return self.cache_dir_collections+'page_'+str(page)+'_'+page_hash+self.file_extension
+
+    def __save_page__(self, page_img, page_file:str, page:int):
+        if not os.path.isdir(self.cache_dir_collections): os.makedirs(self.cache_dir_collections)
+        # previous versions of the page
+        for f in os.listdir(self.cache_dir_collections):
+            if f.startswith('page_'+str(page)+'_') and f.endswith(self.file_extension): os.remove(self.cache_dir_collections+f)
+        tmp_file = page_file+'.tmp'
+        page_img.save(tmp_file, format='PNG')
+        os.replace(tmp_file, page_file)
+
+    # page image of up to cards_in_page cards (card backs for the missing ones).
+    # cards are MTGCardRecords or MTGCards
+    def __render_page__(self, cards:list):
+        card_image_list_as_image = []
+        card_size = self.compositor.get_cell_size()
+        card_back_img = image_cache.get(('card-back', 'base', card_size), lambda: Image.open('./res/mtg-card-back.png').resize(card_size))
+        # downloads the page's missing images concurrently (and decodes them at card_size)
+        collected_cards = [card if isinstance(card, MTGCard) else card.to_card(self.queue_) for card in cards if card.collected]
+        if collected_cards and self.image_fetcher is None: self.image_fetcher = MTGImageFetcher(queue_=self.queue_)
+        with metrics.span('page.images'):
+            collected_images = iter(zip(collected_cards, self.image_fetcher.fetch(collected_cards, card_size if self.thumbnails else None) if collected_cards else []))
+            for card in cards:
+                if card.collected:
+                    card, img = next(collected_images)
+                    if img.size != card_size: img = card.get_image(card_size)
+                    card_image_list_as_image.append(img)
+                else:
+                    card_image_list_as_image.append(card_back_img)
+        for i in range(self.cards_in_page-len(card_image_list_as_image)): card_image_list_as_image.append(card_back_img)
+        with metrics.span('page.compose'):
+            return self.compositor.compose(card_image_list_as_image)
@@ -0,0 +1,87 @@
+######################################################################################################
+# Imports
+from dataclasses import dataclass
+from queue import Queue
+import time
+import requests
+from MTGCard import MTGCard
+from MTGImageFetcher import get_session
+from MTGPriceStore import MTGPriceStore, price_store
+from MTGMetrics import metrics
+from MTGEvents import STATUS, PROGRESS
+
+# Resolves prices of many cards at once through Scryfall's /cards/collection
+# endpoint (up to 75 identifiers per request) instead of one request per card.
+# Requests go through the process wide Scryfall session (shared with image
+# downloads), so connections are reused between resolvers and calls
+@dataclass
+class MTGPriceResolver:
+
+    base_url:str
+    chunk_size:int
+
+    def __init__(self, base_url:str='https://api.scryfall.com', chunk_size:int=75, store:MTGPriceStore=None, queue_:Queue=None, request_delay:float=0.1, session:requests.Session=None):
+        self.base_url = base_url.rstrip('/')
+        # Scryfall does not accept more than 75 identifiers per request
+        self.chunk_size = min(chunk_size, 75)
+        self.store = store if store is not None else price_store
+        self.queue_ = queue_
+        self.request_delay = request_delay # Scryfall asks for 50-100ms between requests
+        self.session = session if session is not None else get_session()
+
+    # scryfallIds with no (or an expired) cached price, without duplicates
+    def get_missing_ids(self, cards:list[MTGCard])->list[str]:
+        missing = []
+        seen = set()
+        for card in cards:
+            if card.scryfallId in seen: continue
+            seen.add(card.scryfallId)
+            if self.store.get(card.scryfallId) is None: missing.append(card.scryfallId)
+        metrics.increment('prices.cached', len(seen)-len(missing))
+        return missing
+
+    def __post_chunk__(self, ids:list[str]):
+        response = self.session.post(self.base_url+'/cards/collection', json={'identifiers':[{'id':i} for i in ids]}, timeout=30)
+        response.raise_for_status()
+        return response.json()
+
+    # fetches prices of scryfallIds with no (or an expired) cached price into the store
+    def fetch_missing(self, scryfallIds:list[str]):
+        scryfallIds = list(dict.fromkeys(scryfallIds))
+        missing = [i for i in scryfallIds if self.store.get(i) is None]
+        metrics.increment('prices.cached', len(scryfallIds)-len(missing))
+        self.__fetch__(missing)
+
+    def __fetch__(self, missing:list[str]):
+        chunks = [missing[i:i+self.chunk_size] for i in range(0, len(missing), self.chunk_size)]
+        for i, chunk in enumerate(chunks):
+            msg = 'Fetching prices of '+str(len(chunk))+' cards ('+str(i+1)+'/'+str(len(chunks))+') from '+self.base_url
+            print(msg, end=' ')
+            if self.queue_ is not None: self.queue_.put((STATUS,msg))
+            try:
+                if i>0 and self.request_delay: time.sleep(self.request_delay)
+                with metrics.span('prices.request'):
+                    collection_json = self.__post_chunk__(chunk)
+                metrics.increment('prices.network', len(chunk))
+                for card_json in collection_json.get('data', []):
+                    self.store.put(card_json['id'], card_json['prices']['usd'], card_json['prices']['usd_foil'])
+                # not found on Scryfall, cached without price so it is not requested again
+                for identifier in collection_json.get('not_found', []):
+                    if 'id' in identifier: self.store.put(identifier['id'], None, None)
+                print('OK!')
+            except Exception as e:
+                print('NOK')
+                if self.queue_ is not None: self.queue_.put((STATUS,'Error fetching prices: '+str(e)))
+            if self.queue_ is not None: self.queue_.put((PROGRESS,('prices', i+1, len(chunks))))
+
+    # fetches missing prices into the store and sets card.price on every card from it.
+    # Cards the batch could not resolve keep an expired price if there is one, 0.0 otherwise
+    def resolve(self, cards:list[MTGCard])->float:
+        self.__fetch__(self.get_missing_ids(cards))
+        total_value = 0.0
+        for card in cards:
+            card.prices_json = self.store.get(card.scryfallId, include_expired=True)
+            p = None if card.prices_json is None else card.prices_json['usd_foil' if card.foil else 'usd']
+            card.price = float(p) if p is not None else 0.0
+            total_value += card.price
+        return total_value
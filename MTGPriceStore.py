@@ -0,0 +1,91 @@
+######################################################################################################
+# Imports
+from dataclasses import dataclass
+import json
+import os
+import threading
+import time
+import numpy as np
+
+# Process-wide cache of card prices (prices.json), loaded once.
+# Every entry keeps the time it was fetched and expires after ttl seconds.
+# Changes are buffered in memory and written with flush()
+@dataclass
+class MTGPriceStore:
+
+    prices_file:str
+    ttl:float
+
+    def __init__(self, prices_file:str='./cache/metadata/prices.json', ttl:float=7*24*60*60):
+        self.prices_file = prices_file
+        self.ttl = ttl
+        self.prices = None
+        self.dirty = False
+        self.lock = threading.RLock()
+
+    def __load__(self):
+        if self.prices is not None: return
+        self.prices = {}
+        if os.path.isfile(self.prices_file):
+            with open(self.prices_file, 'r') as file:
+                self.prices = json.loads(file.read())
+            # entries written by previous versions have no timestamp, use the file date
+            file_mtime = os.path.getmtime(self.prices_file)
+            for entry in self.prices.values():
+                if 'fetched_at' not in entry: entry['fetched_at'] = file_mtime
+
+    def is_expired(self, entry:dict)->bool:
+        return self.ttl is not None and time.time() - entry.get('fetched_at', 0) > self.ttl
+
+    # returns {'usd':..., 'usd_foil':..., 'fetched_at':...} or None if not cached (or expired)
+    def get(self, scryfallId:str, include_expired:bool=False)->dict:
+        with self.lock:
+            self.__load__()
+            entry = self.prices.get(scryfallId)
+            if entry is None or (not include_expired and self.is_expired(entry)): return None
+            return entry
+
+    def put(self, scryfallId:str, usd:str, usd_foil:str)->dict:
+        with self.lock:
+            self.__load__()
+            entry = {'usd_foil':usd_foil, 'usd':usd, 'fetched_at':time.time()}
+            self.prices[scryfallId] = entry
+            self.dirty = True
+            return entry
+
+    # (usd, usd_foil) float arrays for a list of scryfallIds, 0.0 where there is no
+    # price. Expired prices are used as well, arrays are for bulk valuation
+    def get_price_arrays(self, scryfallIds:list[str])->tuple:
+        usd = np.zeros(len(scryfallIds), dtype=np.float64)
+        usd_foil = np.zeros(len(scryfallIds), dtype=np.float64)
+        with self.lock:
+            self.__load__()
+            for i, scryfallId in enumerate(scryfallIds):
+                entry = self.prices.get(scryfallId)
+                if entry is None: continue
+                if entry['usd'] is not None: usd[i] = float(entry['usd'])
+                if entry['usd_foil'] is not None: usd_foil[i] = float(entry['usd_foil'])
+        return usd, usd_foil
+
+    # writes all buffered changes at once (write to temp file, then replace)
+    def flush(self):
+        with self.lock:
+            if not self.dirty: return False
+            prices_dir = os.path.dirname(self.prices_file)
+            if prices_dir and not os.path.isdir(prices_dir): os.makedirs(prices_dir)
+            tmp_file = self.prices_file+'.tmp'
+            with open(tmp_file, 'w') as fp:
+                json.dump(self.prices, fp, indent = 4)
+            os.replace(tmp_file, self.prices_file)
+            self.dirty = False
+            return True
+
+    # drops in-memory prices so they are read from disk again
+    def reload(self):
+        with self.lock:
+            self.prices = None
+            self.dirty = False
+
+######################################################################################################
+# Shared store
+price_store = MTGPriceStore()
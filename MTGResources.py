@@ -0,0 +1,102 @@
+######################################################################################################
+# Imports
+from dataclasses import dataclass
+import threading
+from PIL import Image
+from MTGImageCache import MTGImageCache, image_cache
+
+# Overlays (foil layer, "new" sticker) decoded once per process, with resized
+# variants kept per target size. Composited card images are memoized in the
+# image cache as (scryfallId, variant, size). Returned images are shared, callers
+# must not draw on them (copy first)
+@dataclass
+class MTGResources:
+
+    res_dir:str
+    foil_alpha:int
+
+    def __init__(self, res_dir:str='./res/', foil_alpha:int=64, card_width:int=488, image_cache_:MTGImageCache=None):
+        self.res_dir = res_dir
+        self.foil_alpha = foil_alpha
+        # width the "new" sticker was drawn for, it is scaled for other card widths
+        self.card_width = card_width
+        self.image_cache = image_cache_ if image_cache_ is not None else image_cache
+        self.originals = {} # file name -> decoded RGBA image
+        self.variants = {} # (name, size) -> resized image
+        self.lock = threading.RLock()
+
+    def __get_original__(self, file_name:str)->Image.Image:
+        with self.lock:
+            img = self.originals.get(file_name)
+            if img is None:
+                with Image.open(self.res_dir+file_name) as f:
+                    img = f.convert('RGBA')
+                self.originals[file_name] = img
+            return img
+
+    # foil layer at the given size, RGB. With a constant alpha, compositing it over an
+    # opaque card is a single blend (the layer does not need an alpha channel)
+    def get_foil_layer(self, size:tuple)->Image.Image:
+        key = ('foil', tuple(size))
+        with self.lock:
+            img = self.variants.get(key)
+            if img is None:
+                img = self.__get_original__('foil_layer3.png').resize(size).convert('RGB')
+                self.variants[key] = img
+            return img
+
+    # foil layer at the given size with alpha set, for cards that have transparency
+    def get_foil_layer_rgba(self, size:tuple)->Image.Image:
+        key = ('foil_rgba', tuple(size))
+        with self.lock:
+            img = self.variants.get(key)
+            if img is None:
+                img = self.get_foil_layer(size).convert('RGBA')
+                img.putalpha(self.foil_alpha)
+                self.variants[key] = img
+            return img
+
+    # "new" sticker for a card of the given size
+    def get_new_sticker(self, card_size:tuple)->Image.Image:
+        sticker = self.__get_original__('new.png')
+        if card_size[0]==self.card_width: return sticker
+        key = ('new', tuple(card_size))
+        with self.lock:
+            img = self.variants.get(key)
+            if img is None:
+                scale = card_size[0]/self.card_width
+                img = sticker.resize((max(1, round(sticker.size[0]*scale)), max(1, round(sticker.size[1]*scale))))
+                self.variants[key] = img
+            return img
+
+    def apply_foil(self, img:Image.Image)->Image.Image:
+        if img.mode=='RGB':
+            return Image.blend(img, self.get_foil_layer(img.size), self.foil_alpha/255).convert('RGBA')
+        foil_image = Image.new('RGBA', img.size)
+        foil_image = Image.alpha_composite(foil_image, img.convert('RGBA'))
+        return Image.alpha_composite(foil_image, self.get_foil_layer_rgba(img.size))
+
+    def apply_new_sticker(self, img:Image.Image)->Image.Image:
+        sticker = self.get_new_sticker(img.size)
+        img = img.copy()
+        img.paste(sticker, (img.size[0]-sticker.size[0],0), sticker)
+        return img
+
+    # 'base', 'foil', 'new' or 'foil+new'
+    def get_variant(self, foil:bool, new:bool)->str:
+        return '+'.join([v for v, applied in [('foil', foil), ('new', new)] if applied]) or 'base'
+
+    # card image with its overlays, computed once per scryfallId and size
+    # (size is None for full size images)
+    def get_composite(self, scryfallId:str, img:Image.Image, foil:bool, new:bool, size:tuple=None)->Image.Image:
+        if not foil and not new: return img
+        def composite():
+            c = img
+            if foil: c = self.apply_foil(c)
+            if new: c = self.apply_new_sticker(c)
+            return c
+        return self.image_cache.get((scryfallId, self.get_variant(foil, new), size), composite)
+
+######################################################################################################
+# Shared resources
+resources = MTGResources()
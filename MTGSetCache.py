@@ -0,0 +1,42 @@
+######################################################################################################
+# Imports
+from dataclasses import dataclass
+import sys
+from MTGLRUCache import MTGLRUCache
+
+# In-process LRU cache of set data (set indexes), keyed by set code and source file mtime.
+# Entries are evicted (least recently used first) once the approximate size of
+# all cached sets goes over max_bytes
+@dataclass
+class MTGSetCache(MTGLRUCache):
+
+    def __init__(self, max_bytes:int=256*1024*1024):
+        super().__init__(max_bytes)
+
+    # cached data if it was loaded from the file at mtime, loader() cached otherwise
+    def get(self, set_code:str, mtime:float, loader):
+        return super().get(set_code, loader, mtime)
+
+    # approximate deep size of dicts, lists, scalars and the attributes of objects
+    # (memory mapped tables only count their header, their pages are not owned)
+    def __estimate_size__(self, data)->int:
+        size = 0
+        seen = set()
+        stack = [data]
+        while stack:
+            obj = stack.pop()
+            if id(obj) in seen: continue
+            seen.add(id(obj))
+            size += sys.getsizeof(obj)
+            if isinstance(obj, dict):
+                stack.extend(obj.keys())
+                stack.extend(obj.values())
+            elif isinstance(obj, (list, tuple)):
+                stack.extend(obj)
+            elif hasattr(obj, '__dict__'):
+                stack.append(vars(obj))
+        return size
+
+######################################################################################################
+# Shared cache (used by every MTGJson and MTGCollection in the process)
+set_cache = MTGSetCache()
@@ -0,0 +1,49 @@
+######################################################################################################
+# Imports
+from dataclasses import dataclass
+from MTGCardStore import MTGCardStore, MTGStoredSet
+from MTGSetCache import MTGSetCache, set_cache
+
+# Order of the booster contents (cards not in these sheets are not put in boosters)
+BOOSTER_KEY_ORDER = ['basic', 'common', 'commonWithShowcase', 'uncommon', 'uncommonWithShowcase', 'rare', 'rareMythicWithShowcase', 'rareMythic', 'foil', 'foilWithShowcase']
+
+# Index of a compiled set built once per set, so card lookups read the memory
+# mapped tables directly instead of scanning (or rebuilding) the set json
+@dataclass
+class MTGSetIndex:
+
+    set_code:str
+    rows_by_uuid:dict
+
+    def __init__(self, stored_set:MTGStoredSet):
+        self.stored_set = stored_set
+        self.set_code = stored_set.set_code
+        self.meta = stored_set.meta
+        self.rows_by_uuid = {uuid:row for row, uuid in enumerate(stored_set.get_column('uuid'))}
+        # name lookup is built on first use
+        self.rows_by_name = None
+
+    def __len__(self):
+        return len(self.stored_set)
+
+    def get_card(self, uuid:str):
+        row = self.rows_by_uuid.get(uuid)
+        return None if row is None else self.stored_set.get_card_json(row)
+
+    def get_cards_by_name(self, card_name:str):
+        if self.rows_by_name is None:
+            cards = self.stored_set.cards
+            self.rows_by_name = {}
+            for row, name in enumerate(self.stored_set.get_strings(cards['name_offset'], cards['name_length'])):
+                self.rows_by_name.setdefault(name, []).append(row)
+        return [self.stored_set.get_card_json(row) for row in self.rows_by_name.get(card_name, [])]
+
+    def get_booster_distribution_values(self)->list[str]:
+        return self.stored_set.get_booster_distribution_values()
+
+######################################################################################################
+# Shared indexes, kept in the set cache (one per set code) until the compiled set changes
+def get_set_index(card_store:MTGCardStore, set_code:str, cache:MTGSetCache=None)->MTGSetIndex:
+    mtime = card_store.get_set_mtime(set_code)
+    if mtime is None: return None
+    return (cache if cache is not None else set_cache).get(set_code, mtime, lambda: MTGSetIndex(card_store.open_set(set_code)))
@@ -0,0 +1,110 @@
+######################################################################################################
+# Imports
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+import argparse
+import os
+from queue import Queue
+import zlib
+import numpy as np
+from MTGCardStore import MTGCardStore
+from MTGBoosterSampler import MTGBoosterSampler
+from MTGPriceStore import price_store
+from MTGPriceResolver import MTGPriceResolver
+from MTGEvents import STATUS
+
+######################################################################################################
+# Worker (runs in a separate process, only gets paths, seeds and price arrays)
+def __simulate_shard__(cache_dir_meta:str, cache_dir_store:str, set_code:str, booster_distribution:str, n:int, seed:np.random.SeedSequence, usd:np.ndarray, usd_foil:np.ndarray)->np.ndarray:
+    stored_set = MTGCardStore(cache_dir_meta, cache_dir_store).open_set(set_code)
+    batch = MTGBoosterSampler(stored_set).sample(booster_distribution, n, np.random.default_rng(seed))
+    return batch.get_values(usd, usd_foil)
+
+# Monte Carlo expected value of boosters per set and booster distribution.
+# Simulations are split in shards of shard_size boosters spread over a process pool.
+# Every shard has its own random stream derived from (seed, set, distribution, shard),
+# so results only depend on the seed, not on the number of workers
+@dataclass
+class MTGSimulator:
+
+    workers:int
+    shard_size:int
+    percentiles:list[int]
+
+    def __init__(self, card_store:MTGCardStore=None, workers:int=None, shard_size:int=50000, fetch_prices:bool=True, queue_:Queue=None):
+        self.card_store = card_store if card_store is not None else MTGCardStore()
+        self.workers = workers if workers is not None else (os.cpu_count() or 1)
+        self.shard_size = shard_size
+        self.fetch_prices = fetch_prices
+        self.queue_ = queue_
+        self.percentiles = [5, 25, 50, 75, 95]
+
+    def __put_message__(self, msg:str):
+        print(msg)
+        if self.queue_ is not None: self.queue_.put((STATUS,msg))
+
+    # usd and usd_foil per card store row (missing prices are fetched in bulk unless disabled)
+    def __get_price_arrays__(self, stored_set):
+        scryfallIds = [card['scryfallId'].decode() for card in stored_set.cards]
+        if self.fetch_prices:
+            try:
+                MTGPriceResolver(queue_=self.queue_).fetch_missing(scryfallIds)
+            finally:
+                price_store.flush()
+        return price_store.get_price_arrays(scryfallIds)
+
+    def __get_stats__(self, values:np.ndarray)->dict:
+        stats = {'boosters':int(len(values)), 'mean':float(values.mean()), 'std':float(values.std()),
+                 'min':float(values.min()), 'max':float(values.max())}
+        for p, v in zip(self.percentiles, np.percentile(values, self.percentiles)):
+            stats['p'+str(p)] = float(v)
+        stats['median'] = stats['p50']
+        return stats
+
+    def __get_seeds__(self, seed:int, set_code:str, booster_distribution:str, shards:int)->list:
+        key = zlib.crc32((set_code+'/'+booster_distribution).encode())
+        return np.random.SeedSequence(seed, spawn_key=(key,)).spawn(shards)
+
+    # {set_code: {booster_distribution: stats}} for every set (and every distribution of
+    # the set unless given)
+    def simulate(self, set_codes:list[str], n:int=100000, booster_distributions:list[str]=None, seed:int=0)->dict:
+        jobs = []
+        results = {}
+        for set_code in set_codes:
+            stored_set = self.card_store.open_set(set_code)
+            if stored_set is None:
+                self.__put_message__('Set ['+set_code+'] could not be found.')
+                continue
+            distributions = [d for d in stored_set.get_booster_distribution_values() if booster_distributions is None or d in booster_distributions]
+            if len(distributions)==0: continue
+            usd, usd_foil = self.__get_price_arrays__(stored_set)
+            results[set_code] = {}
+            for booster_distribution in distributions:
+                shards = [self.shard_size]*(n//self.shard_size)
+                if n%self.shard_size: shards.append(n%self.shard_size)
+                seeds = self.__get_seeds__(seed, set_code, booster_distribution, len(shards))
+                jobs.append((set_code, booster_distribution, shards, seeds, usd, usd_foil))
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            futures = []
+            for set_code, booster_distribution, shards, seeds, usd, usd_foil in jobs:
+                futures.append((set_code, booster_distribution, [executor.submit(__simulate_shard__, self.card_store.cache_dir_meta, self.card_store.cache_dir_store,
+                                                                                 set_code, booster_distribution, size, s, usd, usd_foil) for size, s in zip(shards, seeds)]))
+            for set_code, booster_distribution, shard_futures in futures:
+                values = np.concatenate([f.result() for f in shard_futures])
+                results[set_code][booster_distribution] = self.__get_stats__(values)
+                stats = results[set_code][booster_distribution]
+                self.__put_message__('['+set_code+'] '+booster_distribution+': mean $ '+'{:.2f}'.format(stats['mean'])+', median $ '+'{:.2f}'.format(stats['median'])+
+                                     ', p5-p95 $ '+'{:.2f}'.format(stats['p5'])+'-'+'{:.2f}'.format(stats['p95'])+' ('+str(stats['boosters'])+' boosters)')
+        return results
+
+# Initialize
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Expected booster value per set and booster distribution')
+    parser.add_argument('sets', nargs='+', help='set codes, i.e. LTR MOM')
+    parser.add_argument('-n', type=int, default=100000, help='boosters per set and distribution')
+    parser.add_argument('--distribution', action='append', help='only these booster distributions (draft, set, collector...)')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--cached-prices', action='store_true', help='do not fetch missing prices')
+    args = parser.parse_args()
+    MTGSimulator(workers=args.workers, fetch_prices=not args.cached_prices).simulate(args.sets, args.n, args.distribution, args.seed)
@@ -0,0 +1,57 @@
+######################################################################################################
+# Imports
+from dataclasses import dataclass
+from queue import Queue
+import numpy as np
+from MTGBoosterHistory import MTGBoosterHistory
+from MTGPriceStore import MTGPriceStore, price_store
+from MTGPriceResolver import MTGPriceResolver
+
+# Values the collection (every card collected from generated boosters, once per set
+# and uuid) in one pass: owned cards from the booster history are joined with
+# usd/usd_foil price arrays. Missing prices are fetched in bulk first unless disabled
+@dataclass
+class MTGValuation:
+
+    fetch_prices:bool
+    top:int
+
+    def __init__(self, history:MTGBoosterHistory=None, store:MTGPriceStore=None, fetch_prices:bool=True, top:int=10, queue_:Queue=None):
+        self.history = history if history is not None else MTGBoosterHistory()
+        self.store = store if store is not None else price_store
+        self.fetch_prices = fetch_prices
+        self.top = top
+        self.queue_ = queue_
+
+    # {'total', 'cards', 'foil_premium', 'sets':{setCode:{'worth', 'cards', 'foils', 'foil_premium'}},
+    #  'top_cards':[{'setCode', 'name', 'uuid', 'foil', 'price'}]} for all sets or the given ones.
+    # foil_premium is what foil copies add over the non-foil price of the same cards
+    def value(self, set_codes:list[str]=None)->dict:
+        owned = self.history.get_owned_cards(set_codes)
+        scryfallIds = [card[2] for card in owned]
+        if self.fetch_prices and len(owned) > 0:
+            try:
+                MTGPriceResolver(store=self.store, queue_=self.queue_).fetch_missing([i for i in scryfallIds if i is not None])
+            finally:
+                self.store.flush()
+        usd, usd_foil = self.store.get_price_arrays(scryfallIds)
+        foil = np.fromiter((card[4] for card in owned), dtype=bool, count=len(owned))
+        prices = np.where(foil, usd_foil, usd)
+        # only foils priced both ways have a premium (foil-only cards have no non-foil
+        # price, cards without a foil price would count their whole price as negative)
+        premium = np.where(foil & (usd > 0) & (usd_foil > 0), usd_foil-usd, 0.0)
+        # per set sums
+        set_list = sorted({card[0] for card in owned})
+        set_positions = {set_code:i for i, set_code in enumerate(set_list)}
+        set_index = np.fromiter((set_positions[card[0]] for card in owned), dtype=np.int64, count=len(owned))
+        worth = np.bincount(set_index, weights=prices, minlength=len(set_list))
+        cards = np.bincount(set_index, minlength=len(set_list))
+        foils = np.bincount(set_index, weights=foil, minlength=len(set_list))
+        premiums = np.bincount(set_index, weights=premium, minlength=len(set_list))
+        sets = {set_code:{'worth':float(worth[i]), 'cards':int(cards[i]), 'foils':int(foils[i]), 'foil_premium':float(premiums[i])}
+                for i, set_code in enumerate(set_list)}
+        top_cards = []
+        for i in np.argsort(-prices, kind='stable')[:self.top]:
+            set_code, uuid, scryfallId, name, is_foil, count = owned[i]
+            top_cards.append({'setCode':set_code, 'name':name, 'uuid':uuid, 'foil':is_foil, 'price':float(prices[i])})
+        return {'total':float(prices.sum()), 'cards':len(owned), 'foil_premium':float(premium.sum()), 'sets':sets, 'top_cards':top_cards}
@@ -0,0 +1,182 @@
+######################################################################################################
+# Headless command line entry point. Does not import tkinter, heavy modules
+# (numpy, PIL, requests) are only imported by the command that needs them
+import argparse
+import os
+import sys
+import time
+from MTGMetrics import metrics
+from MTGEvents import STATUS, INFO
+
+# Shows the messages MTGJson/MTGCollection put on their queue (replaces the Tk queue
+# polling). Written to stderr as a single status line when it is a terminal
+class ConsoleProgress:
+
+    def __init__(self, verbose:bool=True, stream=sys.stderr):
+        self.verbose = verbose
+        self.stream = stream
+        self.status_line = stream.isatty()
+
+    def put(self, msg, block=True, timeout=None):
+        # only status/info text is shown, other messages carry results or progress (see MTGEvents)
+        if not self.verbose or msg[0] not in [STATUS, INFO]: return
+        text = str(msg[1]).replace('\n', ' ')
+        if self.status_line: self.stream.write('\r'+text[:150]+'\x1b[K')
+        else: self.stream.write(text+'\n')
+        self.stream.flush()
+
+    def clear(self):
+        if self.verbose and self.status_line: self.stream.write('\r\x1b[K')
+
+    def put_nowait(self, msg):
+        self.put(msg)
+
+    def empty(self):
+        return True
+
+######################################################################################################
+# Commands
+def generate(args, progress):
+    from MTGJson import MTGJson
+    mtgjson = MTGJson(progress, background_refresh=False)
+    if args.set not in mtgjson.sets:
+        print(f'Set [{args.set}] could not be found.')
+        return 1
+    distribution = args.distribution or mtgjson.get_booster_distribution_values(args.set)[0]
+    if args.n==1 and not args.headless:
+        booster = mtgjson.generate_booster(args.set, distribution)
+        print('Total booster worth: $ '+'{:.2f}'.format(sum(card.price for card in booster)))
+        return 0
+    batch = mtgjson.generate_boosters(args.set, distribution, args.n, with_images=args.images, with_prices=args.prices, persist=args.persist, seed=args.seed)
+    for i in range(min(len(batch), args.show)):
+        print(batch.get_booster(i))
+    if batch.values is not None:
+        print('Average booster worth: $ '+'{:.2f}'.format(batch.values.mean())+' ('+str(len(batch))+' boosters)')
+    return 0
+
+def value(args, progress):
+    from MTGValuation import MTGValuation
+    valuation = MTGValuation(fetch_prices=not args.cached_prices, top=args.top, queue_=progress).value(args.sets or None)
+    progress.clear()
+    for set_code, set_value in valuation['sets'].items():
+        print('['+set_code+'] collection worth: $ '+'{:.2f}'.format(set_value['worth'])+' ('+str(set_value['cards'])+' cards, '+str(set_value['foils'])+' foils)')
+    if len(valuation['top_cards']) > 0:
+        print('Top cards:')
+        for card in valuation['top_cards']:
+            print('  $ '+'{:>8.2f}'.format(card['price'])+'  ['+card['setCode']+'] '+card['name']+(' (foil)' if card['foil'] else ''))
+    print('Foil premium: $ '+'{:.2f}'.format(valuation['foil_premium']))
+    print('Total collection worth: $ '+'{:.2f}'.format(valuation['total']))
+    return 0
+
+def refresh(args, progress):
+    from MTGDatabase import MTGDatabase
+    changed_sets = MTGDatabase(queue_=progress).refresh(force=args.force)
+    print(str(len(changed_sets))+' sets changed'+(': '+' '.join(changed_sets) if 0<len(changed_sets)<=50 else ''))
+    return 0
+
+def book(args, progress):
+    from MTGCollection import MTGCollection
+    c = MTGCollection(args.set, progress, thumbnails=not args.full)
+    set_index = c.get_set_index()
+    if set_index is None:
+        print(f'Set [{args.set}] could not be found.')
+        return 1
+    collection = c.get_collection(args.set, set_index)
+    # pages are always kept in the page cache (cache/collections/<SET>/), --out copies them
+    out_dir = args.out
+    if out_dir is not None and not os.path.isdir(out_dir): os.makedirs(out_dir)
+    if args.workers is not None and args.workers > 1:
+        # pages rendered (and saved) by a process pool
+        number_of_pages = 0
+        for page_no, page in c.render_collection_book(collection, workers=args.workers, out_dir=out_dir): number_of_pages += 1
+    else:
+        # pages are rendered one by one, the next one in the background while saving
+        pages = c.get_collection_book(collection, set_index, window=2)
+        try:
+            for page_no in range(1, len(pages)+1):
+                pages.prefetch([page_no+1])
+                page_img = pages.get_page(page_no)
+                if out_dir is not None: page_img.save(os.path.join(out_dir, args.set+'_'+str(page_no)+'.png'))
+        finally:
+            pages.close()
+        number_of_pages = len(pages)
+    print(str(number_of_pages)+' pages '+('saved to '+out_dir if out_dir is not None else 'in '+c.cache_dir_collections))
+    return 0
+
+def reindex(args, progress):
+    from MTGBoosterHistory import MTGBoosterHistory
+    print(str(MTGBoosterHistory().rebuild_ownership())+' cards in the ownership index')
+    return 0
+
+def simulate(args, progress):
+    from MTGSimulator import MTGSimulator
+    MTGSimulator(workers=args.workers, fetch_prices=not args.cached_prices).simulate(args.sets, args.n, args.distribution, args.seed)
+    return 0
+
+def get_parser():
+    parser = argparse.ArgumentParser(description='Magic the Gathering booster generator (command line)')
+    parser.add_argument('-q', '--quiet', action='store_true', help='do not print progress messages')
+    parser.add_argument('--metrics', action='store_true', help='print the time spent per phase and where images and prices came from')
+    parser.add_argument('--metrics-file', help='append every timing and counter to this file as JSON lines')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    p = commands.add_parser('generate', help='generate boosters')
+    p.add_argument('set', help='set code, i.e. LTR')
+    p.add_argument('--distribution', help='booster distribution (draft, set, collector...), defaults to the first one')
+    p.add_argument('-n', type=int, default=1, help='number of boosters (more than 1 uses bulk generation)')
+    p.add_argument('--headless', action='store_true', help='use bulk generation for a single booster too')
+    p.add_argument('--images', action='store_true', help='bulk: fetch images')
+    p.add_argument('--prices', action='store_true', help='bulk: fetch prices and print the average value')
+    p.add_argument('--persist', action='store_true', help='bulk: save boosters to the collection')
+    p.add_argument('--seed', type=int, default=None)
+    p.add_argument('--show', type=int, default=5, help='bulk: boosters to print')
+    p.set_defaults(func=generate)
+
+    p = commands.add_parser('value', help='value the collection')
+    p.add_argument('sets', nargs='*', help='set codes (all collected sets if none)')
+    p.add_argument('--top', type=int, default=10, help='most valuable cards to list')
+    p.add_argument('--cached-prices', action='store_true', help='do not fetch missing prices')
+    p.set_defaults(func=value)
+
+    p = commands.add_parser('refresh', help='refresh the card database')
+    p.add_argument('--force', action='store_true', help='download even if unchanged')
+    p.set_defaults(func=refresh)
+
+    p = commands.add_parser('book', help='render the collection book of a set to png files')
+    p.add_argument('set', help='set code, i.e. LEA')
+    p.add_argument('--out', help='also save the pages as <SET>_<page>.png in this folder')
+    p.add_argument('--full', action='store_true', help='decode cards at full size and downsize the pages (slower)')
+    p.add_argument('--workers', type=int, default=None, help='render pages on this many processes')
+    p.set_defaults(func=book)
+
+    p = commands.add_parser('reindex', help='rebuild the ownership index from the booster history')
+    p.set_defaults(func=reindex)
+
+    p = commands.add_parser('simulate', help='expected booster value per set and booster distribution')
+    p.add_argument('sets', nargs='+', help='set codes')
+    p.add_argument('-n', type=int, default=100000, help='boosters per set and distribution')
+    p.add_argument('--distribution', action='append', help='only these booster distributions')
+    p.add_argument('--workers', type=int, default=None)
+    p.add_argument('--seed', type=int, default=0)
+    p.add_argument('--cached-prices', action='store_true', help='do not fetch missing prices')
+    p.set_defaults(func=simulate)
+    return parser
+
+def main(argv=None):
+    start = time.perf_counter()
+    args = get_parser().parse_args(argv)
+    progress = ConsoleProgress(not args.quiet)
+    if args.metrics_file:
+        metrics.set_output(args.metrics_file)
+        # page rendering processes write to the same file
+        os.environ['MTG_METRICS_FILE'] = args.metrics_file
+    try:
+        ret = args.func(args, progress)
+    finally:
+        progress.clear()
+    if not args.quiet: print('Done in '+'{:.2f}'.format(time.perf_counter()-start)+'s')
+    if args.metrics: print('Metrics (total): '+metrics.summary(field='total'))
+    return ret
+
+if __name__ == "__main__":
+    sys.exit(main())
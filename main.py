@@ -2,22 +2,24 @@ import queue
 from tkinter import *
 from tkinter.ttk import *
 import queue
-from MTGBoosterGeneratorGUI import MTGBoosterGeneratorGUI
-from MTGCollectionsGUI import MTGCollectionsGUI
 from tkinter.font import BOLD
+from MTGEvents import event_bus
 
 # creates a Tk() object
 
+# windows are imported on first use, the menu opens without loading numpy/PIL
+# every window gets its own channel, windows open at the same time do not share messages
 def openBoosterGenerator():
-    b = MTGBoosterGeneratorGUI(queue_)
+    from MTGBoosterGeneratorGUI import MTGBoosterGeneratorGUI
+    b = MTGBoosterGeneratorGUI(event_bus.open_channel('booster-generator'))
 
 def openCollection():
-    c = MTGCollectionsGUI(queue_)
+    from MTGCollectionsGUI import MTGCollectionsGUI
+    c = MTGCollectionsGUI(event_bus.open_channel('collection'))
 
 if __name__ == "__main__":
 
     master = Tk()
-    queue_ = queue.Queue()
 
     master.geometry("300x170")
     master.resizable(False, False)